@@ -0,0 +1,109 @@
+# Charles Dieterle
+# Running totals for the simulation files
+# Values are summed as they come in, so a simulation keeps the same small
+# amount of memory no matter how many games it plays.
+
+from math import sqrt
+
+class BucketStats():
+    """
+    The count, sum and sum of squares of values sorted into buckets
+
+    Attributes:
+        counts - list of ints, the number of values added to each bucket
+        sums - list of floats, the sum of the values in each bucket
+        squares - list of floats, the sum of the squared values in each bucket
+
+    Two BucketStats with the same number of buckets can be added together,
+    which merges their totals (see parallel.add_aggregates).
+    """
+
+    def __init__(self, num_buckets):
+        self.counts = [0] * num_buckets
+        self.sums = [0] * num_buckets
+        self.squares = [0] * num_buckets
+
+    # add one value to a bucket
+    def add(self, bucket, value):
+        self.counts[bucket] += 1
+        self.sums[bucket] += value
+        self.squares[bucket] += value * value
+
+    def __add__(self, other):
+        merged = BucketStats(len(self.counts))
+        for i in range(len(self.counts)):
+            merged.counts[i] = self.counts[i] + other.counts[i]
+            merged.sums[i] = self.sums[i] + other.sums[i]
+            merged.squares[i] = self.squares[i] + other.squares[i]
+        return merged
+
+    def __len__(self):
+        return len(self.counts)
+
+    def mean(self, bucket):
+        """
+        Get the average of the values in a bucket
+
+        returns a float, or None if the bucket is empty
+        """
+
+        if self.counts[bucket] == 0:
+            return None
+        return self.sums[bucket] / self.counts[bucket]
+
+    def std(self, bucket):
+        """
+        Get the standard deviation of the values in a bucket
+
+        returns a float, or None if the bucket is empty
+        """
+
+        count = self.counts[bucket]
+        if count == 0:
+            return None
+        mean = self.sums[bucket] / count
+
+        # rounding can leave a tiny negative variance when every value is equal
+        variance = max(self.squares[bucket] / count - mean * mean, 0)
+        return sqrt(variance)
+
+    def total_count(self):
+        return sum(self.counts)
+
+    def total_sum(self):
+        return sum(self.sums)
+
+
+class Collector():
+    """
+    Gathers statistics from simulated games (see harness.py)
+
+    The harness calls each method below as games are played. They do
+    nothing here, so a collector only overrides the ones it needs. A
+    collector should also define __add__ to merge the totals of two
+    collectors, so that games can be shared between processes.
+    """
+
+    # the harness is about to play a run (or a chunk of a run) of games
+    def start_run(self):
+        pass
+
+    # a new game is about to start
+    def start_game(self, game):
+        pass
+
+    # a player made a bet (game.current_bet)
+    def record_bet(self, game):
+        pass
+
+    # a player called dudo (outcome is a perudo.DudoOutcome object)
+    def record_dudo(self, outcome):
+        pass
+
+    # the game is over
+    def end_game(self, game):
+        pass
+
+    # the harness has played every game of the run (or chunk)
+    def end_run(self):
+        pass
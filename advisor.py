@@ -0,0 +1,347 @@
+# Charles Dieterle
+# Local move advisor service for Perudo
+# A long-running asyncio server that answers game states with the
+# probability of success of every possible move, so a helper for many
+# tables at once doesn't have to start Python and answer prompts per query.
+# Requests and responses are JSON lines, the same as the batch mode of
+# move_probability.py: send {"total_dice": 20, "cup": [2, 2, 5],
+# "bet": [4, 6], "previous_dice": 4} and get back
+# {"id": 1, "moves": [["Dudo", 0.41], [4, 7, 0.38], ...]}. Send
+# {"stats": true} for the request count, cache hits and p50/p99 latency.
+# Start a server with Python 3: python advisor.py serve [--unix path]
+# Test it with many clients: python advisor.py load [--clients 50]
+
+import argparse
+import asyncio
+import json
+import move_probability
+import perudo
+import random
+import sys
+from collections import deque
+from time import perf_counter, perf_counter_ns
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+# number of distinct states whose responses the server remembers
+ADVISOR_CACHE_SIZE = 100000
+
+# number of recent requests that latency percentiles are taken from
+LATENCY_WINDOW = 100000
+
+# longest request line, in bytes, that the server reads
+LINE_LIMIT = 2 ** 16
+
+def percentile(values, fraction):
+    """
+    Get a percentile of a list of numbers
+
+    Arguments:
+        values (list) - the numbers, sorted from smallest to largest
+        fraction (float) - .5 for the median, .99 for the 99th percentile
+
+    returns the number, or None if values is empty
+    """
+
+    if values == []:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class LatencyStats():
+    """
+    The latencies of the last LATENCY_WINDOW requests
+
+    Attributes:
+        recent - deque of ints, latencies in nanoseconds
+        count - int representing the number of latencies ever added
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.recent = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, ns):
+        self.recent.append(ns)
+        self.count += 1
+
+    def summary(self):
+        """
+        returns a dict of the request count and the p50, p99 and largest
+            latency (in milliseconds) of the recent requests
+        """
+
+        values = sorted(self.recent)
+        summary = {"requests": self.count}
+        for name, fraction in [("p50_ms", .5), ("p99_ms", .99),
+                                ("max_ms", 1)]:
+            value = percentile(values, fraction)
+            summary[name] = None if value == None else round(value / 1e6, 3)
+        return summary
+
+
+class Advisor():
+    """
+    Answers requests for every connection to a server
+
+    get_all_bets is quick enough (tens of microseconds) that requests are
+    answered right in the event loop. Handing them to a thread pool would
+    only add overhead, since the work holds the GIL.
+
+    Attributes:
+        cache - perudo.StateCache of response text by canonical state
+        latency - LatencyStats of the time to answer each request
+        errors - int representing the number of requests that failed
+        connections - int representing the number of open connections
+    """
+
+    def __init__(self, cache_size=ADVISOR_CACHE_SIZE):
+        self.cache = perudo.StateCache(cache_size)
+        self.latency = LatencyStats()
+        self.errors = 0
+        self.connections = 0
+
+    def stats(self):
+        stats = self.latency.summary()
+        stats.update({"errors": self.errors, "connections": self.connections,
+                        "cache_hits": self.cache.hits,
+                        "cache_misses": self.cache.misses})
+        return stats
+
+    def answer(self, line, request_number):
+        """
+        Answer one request
+
+        States with more than move_probability.MAX_TOTAL_DICE dice, or
+        that aren't whole numbers, are answered with an error before any
+        scoring.
+
+        Arguments:
+            line (bytes) - a JSON object (see move_probability.json_state)
+            request_number (int) - the id of the response if the request
+                doesn't give one
+
+        returns the response as a str, ending in a newline
+        """
+
+        state_id = request_number
+        try:
+            record = json.loads(line)
+            if record.get("stats"):
+                return json.dumps(self.stats()) + "\n"
+            state_id = record.get("id", request_number)
+            state = move_probability.json_state(record)
+        except move_probability.StateError as err:
+            self.errors += 1
+            return json.dumps({"id": state_id, "error": str(err)}) + "\n"
+        except (ValueError, KeyError, TypeError, IndexError,
+                AttributeError) as err:
+            self.errors += 1
+            return json.dumps({"id": state_id, "error": repr(err)}) + "\n"
+
+        total_dice_count, previous_dice_count, next_dice_count, cup,  \
+            bet, palifico = state
+        key = perudo.state_key(total_dice_count, previous_dice_count, cup,
+                                bet, palifico)
+        moves = self.cache.get(key)
+        if moves == None:
+            # a state that can't be scored gets an error response, rather
+            # than dropping the connection
+            try:
+                moves = json.dumps(move_probability.score_state(state))
+            except Exception as err:
+                self.errors += 1
+                return json.dumps({"id": state_id, "error": repr(err)}) + "\n"
+            self.cache.put(key, moves)
+        return f'{{"id": {json.dumps(state_id)}, "moves": {moves}}}\n'
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        request_number = 0
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # a line longer than LINE_LIMIT gets an error, and the
+                    # connection is closed, as the rest of the line can't be
+                    # told apart from the requests after it
+                    request_number += 1
+                    self.errors += 1
+                    writer.write((json.dumps({"id": request_number,
+                                    "error": "request is longer than "\
+                                    f"{LINE_LIMIT} bytes"}) + "\n").encode())
+                    await writer.drain()
+                    break
+                if line == b"":
+                    break
+                if line.strip() == b"":
+                    continue
+                start = perf_counter_ns()
+                request_number += 1
+                writer.write(self.answer(line, request_number).encode())
+                await writer.drain()
+                self.latency.add(perf_counter_ns() - start)
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+
+async def report_stats(advisor, seconds):
+    """Print the advisor's stats every so often, while there are requests"""
+
+    last_count = 0
+    while True:
+        await asyncio.sleep(seconds)
+        if advisor.latency.count != last_count:
+            last_count = advisor.latency.count
+            print(json.dumps(advisor.stats()), file=sys.stderr)
+
+
+async def serve(host=HOST, port=PORT, unix_path=None,
+                cache_size=ADVISOR_CACHE_SIZE, report_seconds=10):
+    """
+    Run an advisor server until it is interrupted
+
+    Arguments:
+        host (str), port (int) - TCP address to listen on
+        unix_path (str) - Unix socket to listen on instead of TCP (if given)
+        cache_size (int) - number of distinct states to remember
+        report_seconds (float) - how often to print stats (None for never)
+    """
+
+    advisor = Advisor(cache_size)
+    if unix_path != None:
+        server = await asyncio.start_unix_server(advisor.handle, unix_path,
+                                                    limit=LINE_LIMIT)
+        print(f"Advisor listening on {unix_path}", file=sys.stderr)
+    else:
+        server = await asyncio.start_server(advisor.handle, host, port,
+                                                limit=LINE_LIMIT)
+        print(f"Advisor listening on {host}:{port}", file=sys.stderr)
+
+    if report_seconds != None:
+        asyncio.get_running_loop().create_task(
+                                    report_stats(advisor, report_seconds))
+    async with server:
+        await server.serve_forever()
+
+
+def random_state(rng, max_players=6):
+    """
+    Make up a game state request for the load generator
+
+    Arguments:
+        rng - random.Random object
+        max_players (int) - most players at the table
+
+    returns a dict for json_state
+    """
+
+    total = rng.randint(2, max_players * perudo.DICE_PER_PLAYER)
+    cup_size = rng.randint(1, min(perudo.DICE_PER_PLAYER, total - 1))
+    record = {"total_dice": total,
+                "cup": [rng.randint(1, perudo.DIE_SIDES)
+                        for d in range(cup_size)],
+                "palifico": rng.random() < .1}
+    if rng.random() < .9:
+        record["bet"] = [rng.randint(1, perudo.DIE_SIDES),
+                            rng.randint(1, max(1, total // 2))]
+        record["previous_dice"] = rng.randint(1,
+                            min(perudo.DICE_PER_PLAYER, total - cup_size))
+    return record
+
+
+async def open_connection(host, port, unix_path):
+    if unix_path != None:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+
+async def load_client(host, port, unix_path, requests, latencies):
+    """Send requests one at a time, timing each response"""
+
+    reader, writer = await open_connection(host, port, unix_path)
+    for request in requests:
+        start = perf_counter_ns()
+        writer.write(request)
+        await writer.drain()
+        await reader.readline()
+        latencies.append(perf_counter_ns() - start)
+    writer.close()
+
+
+async def load(host=HOST, port=PORT, unix_path=None, clients=50,
+                requests=2000, distinct=5000, seed=0):
+    """
+    Load test an advisor server from many concurrent clients
+
+    Each client sends its requests one after another, drawn from a pool of
+    distinct game states, so some of them are repeats like a real set of
+    tables would send. Prints the throughput and the p50/p99 latency seen
+    by the clients, and the server's own stats.
+
+    Arguments:
+        host (str), port (int), unix_path (str) - address of the server
+        clients (int) - number of connections
+        requests (int) - number of requests each client sends
+        distinct (int) - number of distinct game states to draw from
+        seed (int) - random seed of the game states
+
+    returns a dict of the client side stats
+    """
+
+    rng = random.Random(seed)
+    pool = [(json.dumps(random_state(rng)) + "\n").encode()
+            for i in range(distinct)]
+    latencies = []
+    start = perf_counter()
+    await asyncio.gather(*[load_client(host, port, unix_path,
+                                [rng.choice(pool) for r in range(requests)],
+                                latencies)
+                            for c in range(clients)])
+    seconds = perf_counter() - start
+
+    latencies.sort()
+    stats = {"requests": len(latencies), "seconds": round(seconds, 2),
+                "per_second": round(len(latencies) / seconds),
+                "p50_ms": round(percentile(latencies, .5) / 1e6, 3),
+                "p99_ms": round(percentile(latencies, .99) / 1e6, 3)}
+    print(f"Client: {json.dumps(stats)}")
+
+    reader, writer = await open_connection(host, port, unix_path)
+    writer.write(b'{"stats": true}\n')
+    print(f"Server: {(await reader.readline()).decode().strip()}")
+    writer.close()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Perudo move "\
+                    "probabilities over a local socket, or load test a "\
+                    "server.")
+    parser.add_argument("mode", choices=["serve", "load"])
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--unix", metavar="PATH",
+                    help="use a Unix socket instead of TCP")
+    parser.add_argument("--cache-size", type=int, default=ADVISOR_CACHE_SIZE)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000,
+                    help="requests per client")
+    parser.add_argument("--distinct", type=int, default=5000,
+                    help="distinct game states the clients send")
+    args = parser.parse_args()
+
+    try:
+        if args.mode == "serve":
+            asyncio.run(serve(args.host, args.port, args.unix,
+                                args.cache_size))
+        else:
+            asyncio.run(load(args.host, args.port, args.unix, args.clients,
+                                args.requests, args.distinct))
+    except KeyboardInterrupt:
+        pass
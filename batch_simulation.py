@@ -0,0 +1,404 @@
+# Charles Dieterle
+# Perudo simulator that plays thousands of games at once (no human players)
+# Every game is held in NumPy arrays and all of the games are stepped together,
+# using the same safest-move policy as perudo.Game.make_safest_move
+# See rules.txt for an English language explanation of the rules
+
+import numpy as np
+import perudo
+from vectorized_bets import tail_cube, tail_probabilities
+
+# largest player count whose seat lookups come from seat_tables
+SEAT_TABLE_MAX_PLAYERS = 12
+
+def seat_tables(player_count):
+    """
+    Build lookup tables for the seat after and before every seat
+
+    Arguments:
+        player_count (int) - number of seats at the table
+
+    returns two int arrays of shape (2 ** player_count, player_count), where
+        element [alive, seat] is the first seat after (or before) seat whose
+        bit is set in the bitmask alive
+    """
+
+    next_table = np.zeros((1 << player_count, player_count), dtype=np.intp)
+    previous_table = np.zeros((1 << player_count, player_count), dtype=np.intp)
+    for alive in range(1, 1 << player_count):
+        for seat in range(player_count):
+            for offset in range(1, player_count + 1):
+                if alive >> ((seat + offset) % player_count) & 1:
+                    next_table[alive, seat] = (seat + offset) % player_count
+                    break
+            for offset in range(1, player_count + 1):
+                if alive >> ((seat - offset) % player_count) & 1:
+                    previous_table[alive, seat] = (seat - offset) % player_count
+                    break
+    return next_table, previous_table
+
+class BatchGame():
+    """
+    Many games of Perudo with only computer players, played in lockstep
+
+    Games that have a winner are dropped from the arrays below, so every
+    array only covers the games still being played.
+
+    Attributes:
+        ids - int array (games,) of each game's number in the batch
+        dice - int array (games, players, DICE_PER_PLAYER) of die rolls. Only
+            the first cup_sizes[g, p] dice of each cup are in play.
+        cup_sizes - int array (games, players) of dice left in each cup
+        current_player - int array (games,) of whose turn it is
+        bet_num - int array (games,) of the current bet's die number,
+            0 when nobody has bet yet this round
+        bet_total - int array (games,) of the current bet's quantity
+        palifico - bool array (games,), True during palifico rounds
+        dice_count - int array (games,) of how many dice are in play
+        alive - int array (games,) bitmask of the seats that still have
+            dice, or None for tables too big for seat_tables
+
+    The per-game statistics are kept for the whole batch, indexed by ids:
+        successful_dudos - dudo calls that won
+        dudo_prob_sum - summed predicted success of the dudo calls
+        total_bets - bets made
+        rounds - rounds played (one dudo call per round)
+    """
+
+    # start game_count games with player_count players each
+    def __init__(self, game_count, player_count, rng):
+        self.rng = rng
+        self.player_count = player_count
+        self.ids = np.arange(game_count)
+        self.dice = self.roll(game_count)
+        self.cup_sizes = np.full((game_count, player_count),
+                                    perudo.DICE_PER_PLAYER, dtype=np.intp)
+        self.current_player = rng.integers(0, player_count, size=game_count)
+        self.bet_num = np.zeros(game_count, dtype=np.intp)
+        self.bet_total = np.zeros(game_count, dtype=np.intp)
+        self.palifico = np.zeros(game_count, dtype=bool)
+        self.dice_count = np.full(game_count, player_count *  \
+                                    perudo.DICE_PER_PLAYER, dtype=np.intp)
+
+        self.successful_dudos = np.zeros(game_count, dtype=int)
+        self.dudo_prob_sum = np.zeros(game_count)
+        self.total_bets = np.zeros(game_count, dtype=int)
+        self.rounds = np.zeros(game_count, dtype=int)
+
+        self.cube = tail_cube(player_count * perudo.DICE_PER_PLAYER)
+        self.faces = np.arange(1, perudo.DIE_SIDES + 1)
+        self.die_slots = np.arange(perudo.DICE_PER_PLAYER)
+
+        # For small tables, the seat after and before every seat is looked up
+        # from a table indexed by a bitmask of the players who still have dice.
+        # Big tables scan for the next seat instead.
+        self.seat_offsets = np.arange(1, player_count + 1)
+        if player_count <= SEAT_TABLE_MAX_PLAYERS:
+            self.alive = np.full(game_count, (1 << player_count) - 1,
+                                    dtype=np.intp)
+            self.next_table, self.previous_table = seat_tables(player_count)
+        else:
+            self.alive = None
+
+    def roll(self, game_count):
+        """Roll every die of game_count tables"""
+        return self.rng.integers(1, perudo.DIE_SIDES + 1, dtype=np.int8,
+                size=(game_count, self.player_count, perudo.DICE_PER_PLAYER))
+
+    def next_seat(self, g, seats):
+        """Return the first seat after each seat that still has dice"""
+        if self.alive is not None:
+            return self.next_table[self.alive[g], seats]
+        candidates = (seats[:, None] + self.seat_offsets) % self.player_count
+        alive = self.cup_sizes[g[:, None], candidates] > 0
+        return candidates[np.arange(len(g)), alive.argmax(axis=1)]
+
+    def previous_seat(self, g, seats):
+        """Return the first seat before each seat that still has dice"""
+        if self.alive is not None:
+            return self.previous_table[self.alive[g], seats]
+        candidates = (seats[:, None] - self.seat_offsets) % self.player_count
+        alive = self.cup_sizes[g[:, None], candidates] > 0
+        return candidates[np.arange(len(g)), alive.argmax(axis=1)]
+
+    def step(self):
+        """
+        Make one move in every game that is still being played
+
+        returns False once every game has a winner, otherwise True
+        """
+
+        k = len(self.ids)
+        if k == 0:
+            return False
+
+        sides = perudo.DIE_SIDES
+        rows = np.arange(k)
+        cur = self.current_player
+        own_size = self.cup_sizes[rows, cur]
+        dice_count = self.dice_count
+        palifico = self.palifico
+        bet_num = self.bet_num
+        bet_total = self.bet_total
+        has_bet = bet_num > 0
+        n = dice_count - own_size
+
+        # hand[:, num] is how many of the player's dice count toward num.
+        # Dice that are no longer in the cup are counted as face 0.
+        own = np.where(self.die_slots < own_size[:, None], self.dice[rows, cur],
+                        0)
+        counts = np.bincount((own + rows[:, None] * (sides + 1)).ravel(),
+                                minlength=k * (sides + 1)).reshape(k, sides + 1)
+        hand = counts + counts[:, 1:2]
+        hand[:, 1] = counts[:, 1]
+
+        # Candidate moves, in the same order as perudo.get_all_bets:
+        # column 0 is dudo, column 1 raises the quantity by one, and
+        # column 1 + num is a bet on num (see perudo.bet_candidates)
+        faces = self.faces
+
+        # opening bets of a round
+        q_ones = np.maximum(np.round(dice_count / sides - 1), 1).astype(np.intp)
+        q_others = np.where(palifico, q_ones, np.maximum(
+                    np.round(2 * dice_count / sides - 1), 1).astype(np.intp))
+        opening_totals = np.where(faces == 1, q_ones[:, None],
+                                    q_others[:, None])
+
+        # doubling the quantity to move off of 1s, or halving it to move
+        # to 1s, or keeping it on a higher num
+        off_ones = (bet_num == 1)[:, None]
+        doubled = bet_total[:, None] * 2 + 1
+        raised_totals = np.where(off_ones, doubled,
+                            np.where(faces == 1, (bet_total[:, None] + 1) // 2,
+                                    bet_total[:, None]))
+        face_totals = np.where(has_bet[:, None], raised_totals, opening_totals)
+
+        # The engine would never pick a doubled bet that went past the dice
+        # in play (it would be an illegal bet), so those are left out.
+        raised_valid = np.where(off_ones,
+                                (faces > 1) & (doubled <= dice_count[:, None]),
+                                (faces == 1) | (faces > bet_num[:, None]))
+        face_valid = ~has_bet[:, None] | (raised_valid & ~palifico[:, None])
+
+        # probability of each candidate, before the dudo dial
+        bet_hand = hand[rows, bet_num]
+        bet_wild = bet_num != 1
+        cube = self.cube
+        dudo_prob = tail_probabilities(cube, n, bet_total - bet_hand, bet_wild)
+        raise_prob = tail_probabilities(cube, n, bet_total + 1 - bet_hand,
+                                        bet_wild & ~palifico)
+        face_probs = tail_probabilities(cube, n[:, None],
+                                        face_totals - hand[:, 1:],
+                                        (faces != 1) & ~palifico[:, None])
+
+        # the raise by one is dialed, and so are the doubled bets off of 1s
+        prev = self.previous_seat(rows, cur)
+        dial = perudo.dudo_dial(own_size / self.cup_sizes[rows, prev])
+
+        width = sides + 2
+        probs = np.empty((k, width))
+        probs[:, 0] = np.where(has_bet, 1 - dudo_prob + dial, -np.inf)
+        probs[:, 1] = np.where(has_bet & (bet_total != dice_count),
+                                raise_prob - dial, -np.inf)
+        probs[:, 2:] = np.where(face_valid,
+                    np.where(off_ones, face_probs - dial[:, None], face_probs),
+                    -np.inf)
+
+        # like the >= scan in make_safest_move, ties go to the later move
+        choice = width - 1 - probs[:, ::-1].argmax(axis=1)
+        is_dudo = choice == 0
+
+        # make the chosen bets
+        bets = ~is_dudo
+        raised = choice == 1
+        self.bet_num = np.where(bets, np.where(raised, bet_num, choice - 1),
+                                bet_num)
+        self.bet_total = np.where(bets, np.where(raised, bet_total + 1,
+                        face_totals[rows, np.maximum(choice - 2, 0)]),
+                        bet_total)
+        self.total_bets[self.ids[bets]] += 1
+        self.current_player = np.where(bets, self.next_seat(rows, cur), cur)
+
+        # resolve the dudo calls
+        if is_dudo.any():
+            self.resolve_dudo(np.flatnonzero(is_dudo), prev[is_dudo],
+                                probs[is_dudo, 0])
+
+        return True
+
+    def resolve_dudo(self, g, defender, predicted):
+        """
+        Settle dudo calls and start the next round of each game
+
+        Arguments:
+            g - int array of the games (rows) in which dudo was called
+            defender - int array of the players whose bets were called
+            predicted - float array of each call's predicted success
+        """
+
+        caller = self.current_player[g]
+        num = self.bet_num[g, None, None]
+        dice = self.dice[g]
+        in_cup = self.die_slots < self.cup_sizes[g][:, :, None]
+        matches = dice == num
+        # if palifico round, 1s aren't wildcard
+        matches |= (dice == 1) & ~self.palifico[g, None, None]
+        actual_total = (matches & in_cup).sum(axis=(1, 2))
+
+        caller_wins = self.bet_total[g] > actual_total
+        loser = np.where(caller_wins, defender, caller)
+
+        ids = self.ids[g]
+        self.rounds[ids] += 1
+        self.dudo_prob_sum[ids] += predicted
+        self.successful_dudos[ids] += caller_wins
+
+        self.cup_sizes[g, loser] -= 1
+        self.dice_count[g] -= 1
+        losers_cup = self.cup_sizes[g, loser]
+        eliminated = losers_cup == 0
+        if self.alive is not None:
+            self.alive[g] &= ~(eliminated << loser)
+        players_remaining = (self.cup_sizes[g] > 0).sum(axis=1)
+
+        # palifico rounds only occur when more than 2 players remain
+        self.palifico[g] = (losers_cup == 1) & (players_remaining > 2)
+
+        # if the loser was eliminated, the next player starts the next round
+        self.current_player[g] = np.where(eliminated,
+                                            self.next_seat(g, loser), loser)
+
+        # start a new round
+        self.bet_num[g] = 0
+        self.bet_total[g] = 0
+        self.dice[g] = self.roll(len(g))
+
+        # drop the games that are over
+        if (players_remaining == 1).any():
+            live = np.ones(len(self.ids), dtype=bool)
+            live[g[players_remaining == 1]] = False
+            for name in ["ids", "dice", "cup_sizes", "current_player",
+                        "bet_num", "bet_total", "palifico", "dice_count"]:
+                setattr(self, name, getattr(self, name)[live])
+            if self.alive is not None:
+                self.alive = self.alive[live]
+
+    def play(self):
+        """Play every game to the end"""
+        while self.step():
+            pass
+
+
+def batch_simulator(player_count, num_trials, batch_size=10000, seed=None):
+    """
+    Simulate multiple games of Perudo in batches of lockstep games
+
+    Arguments:
+        player_count (int) - number of players in the game
+        num_trials (int) - number of games simulated
+        batch_size (int) - number of games played at once
+        seed (int) - seed for the random dice rolls, or None
+
+    Returns three float arrays with one entry per game, the same statistics
+    that simulation.single_game returns:
+        - Fraction of dudo calls that were correct (i.e., the bet was wrong)
+        - Avg calculated probability of dudo success
+        - Avg number of bets per round
+    """
+
+    rng = np.random.default_rng(seed)
+    dudo_actual, dudo_calculations, bet_numbers = [], [], []
+
+    for start in range(0, num_trials, batch_size):
+        batch = BatchGame(min(batch_size, num_trials - start), player_count,
+                            rng)
+        batch.play()
+        dudo_actual.append(batch.successful_dudos / batch.rounds)
+        dudo_calculations.append(batch.dudo_prob_sum / batch.rounds)
+        bet_numbers.append(batch.total_bets / batch.rounds)
+
+    return np.concatenate(dudo_actual), np.concatenate(dudo_calculations),  \
+            np.concatenate(bet_numbers)
+
+
+def object_game(player_count):
+    """
+    Play one game with perudo.Game and return the batch engine's statistics
+
+    A dudo call counts as correct when the caller keeps all of their dice,
+    which is how BatchGame scores it (and the same as
+    perudo.DudoOutcome.successful), so the two engines can be compared.
+    """
+
+    my_game = perudo.Game(player_count)
+    successful_dudos = 0
+    dudo_prob_sum = 0
+    total_bets = 0
+    rounds = 0
+
+    while my_game.players_left() > 1:
+        outcome = my_game.make_safest_move()
+
+        if outcome != None:
+            dudo_prob_sum += outcome.probability
+            rounds += 1
+            if outcome.successful:
+                successful_dudos += 1
+        else:
+            total_bets += 1
+
+    return successful_dudos / rounds, dudo_prob_sum / rounds,  \
+            total_bets / rounds
+
+
+def compare(player_count, num_trials, batch_size=10000):
+    """
+    Check the batch engine against perudo.Game
+
+    Arguments:
+        player_count (int) - number of players in the game
+        num_trials (int) - number of games simulated by each engine
+        batch_size (int) - number of games the batch engine plays at once
+
+    Print the mean of each statistic for both engines, how many standard
+    errors apart they are, and the games per second of each engine
+    """
+
+    from time import perf_counter
+
+    start = perf_counter()
+    batch_stats = batch_simulator(player_count, num_trials, batch_size)
+    batch_time = perf_counter() - start
+
+    start = perf_counter()
+    object_stats = np.array([object_game(player_count)
+                            for i in range(num_trials)]).T
+    object_time = perf_counter() - start
+
+    names = ["Actual dudo success rate", "Calculated dudo success rate",
+                "Avg number of bets per round"]
+    for name, b, o in zip(names, batch_stats, object_stats):
+        error = np.sqrt(b.var() / len(b) + o.var() / len(o))
+        print(f"{name}: batch {b.mean():.4f}, object {o.mean():.4f} "\
+                f"({abs(b.mean() - o.mean()) / error:.1f} standard errors)")
+    print(f"Games per second: batch {num_trials / batch_time:.0f}, "\
+            f"object {num_trials / object_time:.0f}")
+
+
+def simulator(player_count, num_trials, batch_size=10000):
+    """
+    Simulate multiple games of Perudo, printing the same statistics as
+    simulation.simulator
+    """
+
+    dudo_actual, dudo_calculations, bet_numbers = batch_simulator(
+                                    player_count, num_trials, batch_size)
+
+    print(f"Actual dudo success rate: {dudo_actual.mean()}\n" \
+        f"Calculated dudo success rate: {dudo_calculations.mean()}\n" \
+        f"Avg number of bets per round: {bet_numbers.mean()}")
+
+
+if __name__ == "__main__":
+    # change the arguments below to desired player count and number of games
+    simulator(6, 100000)
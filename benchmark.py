@@ -0,0 +1,365 @@
+# Charles Dieterle
+# Timing benchmarks for the Perudo engine
+# Run with Python 3: python benchmark.py
+# Every benchmark uses fixed seeds, and the results are compared against the
+# baselines stored in benchmark_baseline.json. Run python benchmark.py save
+# to store the current results as the new baselines.
+
+import copy
+import json
+import os
+import perudo
+import random
+import sys
+from time import perf_counter
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "benchmark_baseline.json")
+
+# a result this much slower than its baseline is reported as a regression
+# (timings of the small benchmarks can vary by a third from run to run)
+TOLERANCE = .5
+
+# each benchmark is timed this many times, and the fastest time is kept
+REPEATS = 7
+
+def probability_latency(dice_counts, calls):
+    """
+    Time get_probability for games of increasing size
+
+    For each dice count, a random cup and a set of bets close to the expected
+    quantity are generated with a fixed seed. The first call for each size
+    (which may have to build new rows of the tail table) is timed separately
+    from the per-call latency of the calls after it.
+
+    Arguments:
+        dice_counts (list of ints) - total dice in play for each measurement
+        calls (int) - number of get_probability calls timed per dice count
+
+    Print the cold (first call) time and the mean per-call latency in
+    microseconds for each dice count
+    """
+
+    rng = random.Random(2020)
+
+    print(f"{'dice':>8} {'cold (us)':>12} {'per call (us)':>14}")
+    for dice_count in dice_counts:
+        cup = [rng.randint(1, perudo.DIE_SIDES)
+                for i in range(perudo.DICE_PER_PLAYER)]
+
+        # spread the bets around the expected number of matching dice
+        expected = dice_count // 3
+        spread = max(1, int(dice_count ** .5))
+        bets = [perudo.Bet(rng.randint(1, perudo.DIE_SIDES),
+                        max(1, expected + rng.randint(-spread, spread)))
+                for i in range(100)]
+
+        start = perf_counter()
+        perudo.get_probability(dice_count, cup, bets[0])
+        cold = perf_counter() - start
+
+        # warm every row these bets need before timing
+        for b in bets:
+            perudo.get_probability(dice_count, cup, b)
+            perudo.get_probability(dice_count, cup, b, palifico=True)
+
+        start = perf_counter()
+        for i in range(calls):
+            perudo.get_probability(dice_count, cup, bets[i % 100], i % 7 == 0)
+        per_call = (perf_counter() - start) / calls
+
+        print(f"{dice_count:>8} {cold * 1e6:>12.1f} {per_call * 1e6:>14.3f}")
+
+
+def best_time(function, repeats=REPEATS):
+    """
+    Time a function, keeping the fastest of several runs
+
+    Arguments:
+        function (function) - takes no arguments, and returns the number of
+            operations it timed, or a tuple of (operations, seconds) if it
+            times itself (to leave out its own setup)
+        repeats (int) - number of runs
+
+    returns a float, the fewest seconds per operation
+    """
+
+    best = None
+    for i in range(repeats):
+        start = perf_counter()
+        result = function()
+        seconds = perf_counter() - start
+        if type(result) == tuple:
+            result, seconds = result
+        if best == None or seconds / result < best:
+            best = seconds / result
+    return best
+
+
+def bench_probability(dice_count, calls=20000):
+    """Time get_probability for one total dice count"""
+    rng = random.Random(dice_count)
+    cup = [rng.randint(1, perudo.DIE_SIDES)
+            for i in range(perudo.DICE_PER_PLAYER)]
+    expected = dice_count // 3
+    spread = max(1, int(dice_count ** .5))
+    bets = [perudo.Bet(rng.randint(1, perudo.DIE_SIDES),
+                    max(1, expected + rng.randint(-spread, spread)))
+            for i in range(100)]
+
+    # warm every row of the tail table the bets need
+    for b in bets:
+        perudo.get_probability(dice_count, cup, b)
+        perudo.get_probability(dice_count, cup, b, palifico=True)
+
+    def run():
+        for i in range(calls):
+            perudo.get_probability(dice_count, cup, bets[i % 100], i % 7 == 0)
+        return calls
+
+    return best_time(run)
+
+
+# The betting states for get_all_bets, as (bet num, bet total, palifico).
+# None stands for the opening bet of a round.
+BET_STATES = {
+    "opening": None,
+    "mid": (4, 8, False),
+    "after_ones": (1, 4, False),
+    "palifico": (3, 5, True),
+}
+
+def bench_all_bets(state, calls=5000):
+    """Time get_all_bets for one of the states in BET_STATES (30 dice)"""
+    rng = random.Random(state)
+    cups = [[rng.randint(1, perudo.DIE_SIDES)
+                for i in range(perudo.DICE_PER_PLAYER)]
+            for j in range(100)]
+    palifico = False
+    bet = None
+    if BET_STATES[state] != None:
+        num, total, palifico = BET_STATES[state]
+        bet = perudo.Bet(num, total)
+    perudo.build_tail_table(30)
+
+    def run():
+        for i in range(calls):
+            perudo.get_all_bets(30, 5, 5, cups[i % 100], bet, palifico)
+        return calls
+
+    return best_time(run)
+
+
+def bench_make_bet(calls=20000):
+    """Time Game.make_bet raising the bet on a fresh round"""
+    random.seed(2020)
+    my_game = perudo.Game(6)
+    opening = perudo.Bet(3, 7)
+
+    def run():
+        for i in range(calls):
+            my_game.current_bet = opening
+            my_game.bets.clear()
+            my_game.make_bet(4, 7)
+        return calls
+
+    return best_time(run)
+
+
+def bench_dudo(calls=2000):
+    """Time Game.dudo, including the new round that it starts"""
+
+    def run():
+        random.seed(2020)
+        games = []
+        for i in range(calls):
+            my_game = perudo.Game(6)
+            my_game.make_bet(3, 7)
+            games.append(my_game)
+        start = perf_counter()
+        for my_game in games:
+            my_game.dudo()
+        return calls, perf_counter() - start
+
+    return best_time(run)
+
+
+def recorded_moves(player_count=6, games=20):
+    """
+    Play games between computer players, saving each state and move
+
+    returns a tuple of lists of (GameState, move) pairs (bets, dudo calls),
+        with bets as (num, total) tuples
+    """
+
+    random.seed(player_count)
+    bets, dudos = [], []
+    for i in range(games):
+        my_game = perudo.Game(player_count)
+        while my_game.players_left() > 1:
+            state = my_game.snapshot()
+            if my_game.make_safest_move() == None:
+                bets.append((state, (my_game.current_bet.num,
+                                        my_game.current_bet.total)))
+            else:
+                dudos.append((state, "Dudo"))
+    return bets, dudos
+
+
+def bench_snapshot(calls=20000):
+    """Time Game.snapshot in the middle of a round of a 6 player game"""
+    random.seed(2020)
+    my_game = perudo.Game(6)
+    my_game.make_bet(3, 7)
+    my_game.make_bet(3, 8)
+
+    def run():
+        for i in range(calls):
+            my_game.snapshot()
+        return calls
+
+    return best_time(run)
+
+
+def bench_restore(calls=20000):
+    """Time Game.restore, going back and forth between two states"""
+    random.seed(2020)
+    my_game = perudo.Game(6)
+    my_game.make_bet(3, 7)
+    states = [my_game.snapshot()]
+    my_game.dudo()
+    states.append(my_game.snapshot())
+
+    def run():
+        for i in range(calls):
+            my_game.restore(states[i % 2])
+        return calls
+
+    return best_time(run)
+
+
+def bench_deepcopy(calls=2000):
+    """Time copy.deepcopy of a Game, for comparison with snapshot"""
+    random.seed(2020)
+    my_game = perudo.Game(6)
+    my_game.make_bet(3, 7)
+    my_game.move_list
+
+    def run():
+        for i in range(calls):
+            copy.deepcopy(my_game)
+        return calls
+
+    return best_time(run)
+
+
+def bench_apply(moves):
+    """Time apply_move over a list of (GameState, move) pairs"""
+    dice = perudo.DiceSource(2020)
+
+    def run():
+        for state, move in moves:
+            perudo.apply_move(state, move, dice)
+        return len(moves)
+
+    return best_time(run)
+
+
+def bench_games(player_count, games):
+    """Time whole games between computer players"""
+
+    def run():
+        random.seed(player_count)
+        for i in range(games):
+            my_game = perudo.Game(player_count)
+            while my_game.players_left() > 1:
+                my_game.make_safest_move()
+        return games
+
+    return best_time(run, 3)
+
+
+def run_suite():
+    """
+    Run every benchmark
+
+    returns a dict of benchmark names and seconds per operation
+    """
+
+    results = {}
+    for dice_count in [10, 30, 100, 300, 1000, 10000]:
+        results[f"get_probability/{dice_count} dice"] =  \
+                                                bench_probability(dice_count)
+    for state in BET_STATES:
+        results[f"get_all_bets/{state}"] = bench_all_bets(state)
+    results["Game.make_bet"] = bench_make_bet()
+    results["Game.dudo"] = bench_dudo()
+    results["Game.snapshot"] = bench_snapshot()
+    results["Game.restore"] = bench_restore()
+    results["copy.deepcopy(Game)"] = bench_deepcopy()
+    bets, dudos = recorded_moves()
+    results["apply_move/bet"] = bench_apply(bets)
+    results["apply_move/dudo"] = bench_apply(dudos)
+    for player_count, games in [(2, 400), (6, 100), (20, 10)]:
+        results[f"game/{player_count} players"] =  \
+                                            bench_games(player_count, games)
+    return results
+
+
+def report(results, baseline):
+    """
+    Print each result next to its baseline
+
+    Arguments:
+        results (dict) - from run_suite
+        baseline (dict) - stored results to compare against (may be empty)
+
+    returns the number of results that were more than TOLERANCE slower than
+        their baselines
+    """
+
+    regressions = 0
+    print(f"{'benchmark':<30} {'us/op':>12} {'baseline':>12} {'change':>8}")
+    for name, seconds in results.items():
+        line = f"{name:<30} {seconds * 1e6:>12.2f}"
+        if name in baseline:
+            change = seconds / baseline[name] - 1
+            line += f" {baseline[name] * 1e6:>12.2f} {change:>+8.0%}"
+            if change > TOLERANCE:
+                line += "  REGRESSION"
+                regressions += 1
+        if name.startswith("game/"):
+            line += f"  ({1 / seconds:.0f} games/sec)"
+        elif name.startswith("apply_move/"):
+            line += f"  ({1 / seconds:.0f} moves/sec)"
+        print(line)
+    return regressions
+
+
+def main(args):
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)
+
+    results = run_suite()
+    regressions = report(results, baseline)
+
+    if "save" in args:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Saved the results as the baselines in {BASELINE_FILE}")
+    elif regressions > 0:
+        print(f"{regressions} benchmarks were more than {TOLERANCE:.0%} "\
+                "slower than their baselines")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    # python benchmark.py latency prints the cold and warm latency of
+    # get_probability for much larger games
+    if "latency" in sys.argv[1:]:
+        probability_latency([10, 30, 100, 300, 1000, 3000, 10000], 100000)
+    else:
+        sys.exit(main(sys.argv[1:]))
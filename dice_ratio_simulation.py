@@ -3,32 +3,20 @@
 # Plots data about dudo success, relative to players' dice counts
 # See rules.txt for an English language explanation of the rules
 
+import harness
 import perudo
+from accumulators import BucketStats, Collector
 from matplotlib import pyplot as plt
 
-def simulator(player_count, num_trials, num_intervals, cup_sizes):
+def ratio_range(player_count, num_intervals):
     """
-    Plot statistics on dudo calls based on multiple simulated games of Perudo
-
-    Creates two plots:
-        1. The predicted success of dudo and the actual success of dudo, grouped
-            by the ratio of dice counts between the defensive player and the
-            whole table
-        2. The same as the other plot, except using the dice count of the
-            offensive player
+    Get the range of player-to-table dice ratios and the width of a bucket
 
     Arguments:
         player_count (int) - number of players
-        num_trials (int) - number of games to be simulated
-        num_intervals (int) - determines how many intervals to include on the
-            horizontal axis of the plots.
-        cup_sizes (list of ints) - list of cup sizes that you want to be counted
-            during data collection. For example, passing [1, 2] will only
-            count dudo calls when the previous or current player had one or
-            two dice in their cup at the time.
+        num_intervals (int) - number of buckets the range is divided into
 
-    Note: Plots will have a horizontal axis related to ratio between the
-        dice count of individual players and the dice count of the entire game
+    returns a tuple of floats (min_ratio, max_ratio, step)
     """
 
     dice_per_player = perudo.DICE_PER_PLAYER
@@ -42,114 +30,147 @@ def simulator(player_count, num_trials, num_intervals, cup_sizes):
     ratio_diff = max_ratio - min_ratio
     step = ratio_diff / num_intervals
 
-    # The data will be divided according to player's dice to total dice ratios.
-    # Therefore, it's necessary to convert the ratios into integer bucket
-    # numbers that represent ranges of ratios.
-    def get_bucket(ratio):
-        """
-        Get the appropriate bucket number from a given ratio
-
-        If the ratio is min_ratio, the bucket is 0, and if it is max_ratio,
-        the bucket is num_intervals - 1. The range of each bucket is
-        the value of the variable step, which is ratio_diff / num_intervals
-        """
-        if ratio == max_ratio:
-            return num_intervals - 1
-        else:
-            return int((ratio - min_ratio) / step)
-
-    # The lists below will each have num_intervals empty-list elements, into
-    # which the predicted rates of dudo and actual dudo outcomes will be placed
-    # based on the ratio of dice in the player's cup to the total number of
-    # dice in play.
-    previous_predicted, previous_actual = [], []
-    current_predicted, current_actual = [], []
+    return min_ratio, max_ratio, step
 
-    for i in range(num_intervals):
-        previous_predicted.append([])
-        previous_actual.append([])
-        current_predicted.append([])
-        current_actual.append([])
-
-    # start the simulation
-    for i in range(num_trials):
-        my_game = perudo.Game(player_count)
-        previous_player = None
-        while my_game.players_left() > 1:
-            total_dice_count = my_game.dice_count
-            betting_player = my_game.current_player
-            current_cup_len = len(my_game.players[betting_player].cup)
-            if previous_player != None:
-                previous_cup_len = len(my_game.players[previous_player].cup)
-
-            # This will update the state of my_game, including current_player
-            # When a dudo is called, make_safest_move returns a float that
-            # represents the calculated probability of success of that call.
-            safest_move = my_game.make_safest_move()
-
-            # when dudo is called, add data to the lists declared above
-            if my_game.current_bet == None:
-                previous_ratio = previous_cup_len / total_dice_count
-                current_ratio = current_cup_len / total_dice_count
-
-                previous_bucket = get_bucket(previous_ratio)
-                current_bucket = get_bucket(current_ratio)
-
-                # If dudo was successful, append 1 to appropriate buckets,
-                # else append 0
-                if betting_player != my_game.current_player or  \
-                                    my_game.players[previous_player].cup == []:
-                    if previous_cup_len in cup_sizes:
-                        previous_actual[previous_bucket].append(1)
-                        previous_predicted[previous_bucket].append(safest_move)
-                    if current_cup_len in cup_sizes:
-                        current_actual[current_bucket].append(1)
-                        current_predicted[current_bucket].append(safest_move)
-                else:
-                    if previous_cup_len in cup_sizes:
-                        previous_actual[previous_bucket].append(0)
-                        previous_predicted[previous_bucket].append(safest_move)
-                    if current_cup_len in cup_sizes:
-                        current_actual[current_bucket].append(0)
-                        current_predicted[current_bucket].append(safest_move)
-
-                previous_player = None
-
-            # in this case, dudo wasn't called, so just go to the next turn
-            else:
-                previous_player = betting_player
+# The data will be divided according to player's dice to total dice ratios.
+# Therefore, it's necessary to convert the ratios into integer bucket
+# numbers that represent ranges of ratios.
+def get_bucket(ratio, player_count, num_intervals):
+    """
+    Get the appropriate bucket number from a given ratio
 
-    # Prepare the gathered data to be plotted
-    # by taking the average of each sub-list
-    for i in range(num_intervals):
-        previous_bucket_size = len(previous_actual[i])
-        # If the list is empty, there were no dudo calls in that ratio range,
-        # and therefore no data.
-        if previous_bucket_size != 0:
-            previous_predicted[i] = sum(previous_predicted[i]) / previous_bucket_size
-            previous_actual[i] = sum(previous_actual[i]) / previous_bucket_size
+    If the ratio is min_ratio, the bucket is 0, and if it is max_ratio,
+    the bucket is num_intervals - 1. The range of each bucket is
+    the value of the variable step, which is ratio_diff / num_intervals
+    """
+    min_ratio, max_ratio, step = ratio_range(player_count, num_intervals)
+    if ratio == max_ratio:
+        return num_intervals - 1
+    else:
+        return int((ratio - min_ratio) / step)
 
-        current_bucket_size = len(current_actual[i])
-        if current_bucket_size != 0:
-            current_predicted[i] = sum(current_predicted[i]) / current_bucket_size
-            current_actual[i] = sum(current_actual[i]) / current_bucket_size
+class TableRatioCollector(Collector):
+    """
+    Totals up dudo calls in buckets of players' shares of the dice in play
 
-        if previous_predicted[i] != [] and current_predicted [i] != []:
+    Attributes:
+        player_count (int) - number of players
+        num_intervals (int) - number of buckets
+        cup_sizes (list of ints) - see simulator
+        previous_predicted, previous_actual (BucketStats) - the predicted
+            success and the actual success (1 for a successful call, 0
+            otherwise), by the previous player's ratio of the dice in play
+        current_predicted, current_actual (BucketStats) - the same, by the
+            current player's ratio
+    """
+
+    def __init__(self, player_count, num_intervals, cup_sizes):
+        self.player_count = player_count
+        self.num_intervals = num_intervals
+        self.cup_sizes = cup_sizes
+        self.previous_predicted = BucketStats(num_intervals)
+        self.previous_actual = BucketStats(num_intervals)
+        self.current_predicted = BucketStats(num_intervals)
+        self.current_actual = BucketStats(num_intervals)
+
+    def record_dudo(self, outcome):
+        previous_cup_len = outcome.defender_dice
+        current_cup_len = outcome.caller_dice
+        previous_ratio = previous_cup_len / outcome.dice_count
+        current_ratio = current_cup_len / outcome.dice_count
+
+        previous_bucket = get_bucket(previous_ratio, self.player_count,
+                                        self.num_intervals)
+        current_bucket = get_bucket(current_ratio, self.player_count,
+                                        self.num_intervals)
+
+        # If dudo was successful, add 1 to appropriate buckets
+        success = int(outcome.successful)
+
+        if previous_cup_len in self.cup_sizes:
+            self.previous_actual.add(previous_bucket, success)
+            self.previous_predicted.add(previous_bucket, outcome.probability)
+        if current_cup_len in self.cup_sizes:
+            self.current_actual.add(current_bucket, success)
+            self.current_predicted.add(current_bucket, outcome.probability)
+
+    def __add__(self, other):
+        merged = TableRatioCollector(self.player_count, self.num_intervals,
+                                        self.cup_sizes)
+        merged.previous_predicted =  \
+                            self.previous_predicted + other.previous_predicted
+        merged.previous_actual = self.previous_actual + other.previous_actual
+        merged.current_predicted =  \
+                            self.current_predicted + other.current_predicted
+        merged.current_actual = self.current_actual + other.current_actual
+        return merged
+
+def print_statistics(collector):
+    """
+    Print the avg. predicted and actual success of dudo in each bucket
+
+    Arguments:
+        collector (TableRatioCollector) - the data from the simulated games
+    """
+
+    for i in range(collector.num_intervals):
+        previous_bucket_size = collector.previous_predicted.counts[i]
+        current_bucket_size = collector.current_predicted.counts[i]
+
+        if previous_bucket_size != 0 and current_bucket_size != 0:
             print(f"Interval number {i} statistics:\n")
 
-        if previous_predicted[i] != []:
-            print(f"Previous player predicted success: {previous_predicted[i]:.2f}\n"
-                f"Previous player actual success: {previous_actual[i]:.2f}")
+        # If the count is 0, there were no dudo calls in that ratio range,
+        # and therefore no data.
+        if previous_bucket_size != 0:
+            print(f"Previous player predicted success: "\
+                f"{collector.previous_predicted.mean(i):.2f} "\
+                f"(std. dev. {collector.previous_predicted.std(i):.2f})\n"\
+                f"Previous player actual success: "\
+                f"{collector.previous_actual.mean(i):.2f} "\
+                f"(std. dev. {collector.previous_actual.std(i):.2f})")
             print(f"sample size: {previous_bucket_size}")
-        else:
-            # Don't plot the ratios for which there is no data
-            previous_predicted[i], previous_actual[i] = None, None
-        if current_predicted[i] != []:
-            print(f"Current player predicted success: {current_predicted[i]:.2f}\n"
-                f"Current player actual success: {current_actual[i]:.2f}")
+        if current_bucket_size != 0:
+            print(f"Current player predicted success: "\
+                f"{collector.current_predicted.mean(i):.2f} "\
+                f"(std. dev. {collector.current_predicted.std(i):.2f})\n"\
+                f"Current player actual success: "\
+                f"{collector.current_actual.mean(i):.2f} "\
+                f"(std. dev. {collector.current_actual.std(i):.2f})")
             print(f"sample size: {current_bucket_size}\n")
-        else:
-            current_predicted[i], current_actual[i] = None, None
+
+def plot(collector, num_trials, filenames=None):
+    """
+    Plot the avg. predicted and actual success of dudo in each bucket
+
+    Creates two plots:
+        1. The predicted success of dudo and the actual success of dudo, grouped
+            by the ratio of dice counts between the defensive player and the
+            whole table
+        2. The same as the other plot, except using the dice count of the
+            offensive player
+
+    Arguments:
+        collector (TableRatioCollector) - the data from the simulated games
+        num_trials (int) - number of games that were simulated
+        filenames (tuple of strs) - files to save the two plots to, instead
+            of showing them
+    """
+
+    num_intervals = collector.num_intervals
+    min_ratio, max_ratio, step = ratio_range(collector.player_count,
+                                                num_intervals)
+
+    # Prepare the gathered data to be plotted
+    # by taking the average of each bucket. If a bucket is empty, its
+    # average is None, so the ratios for which there is no data aren't plotted
+    previous_predicted, previous_actual = [], []
+    current_predicted, current_actual = [], []
+    for i in range(num_intervals):
+        previous_predicted.append(collector.previous_predicted.mean(i))
+        previous_actual.append(collector.previous_actual.mean(i))
+        current_predicted.append(collector.current_predicted.mean(i))
+        current_actual.append(collector.current_actual.mean(i))
 
     # create array of values to act as x-axis markers
     interval_markers = []
@@ -169,7 +190,11 @@ def simulator(player_count, num_trials, num_intervals, cup_sizes):
     plt.title("Success rate of dudo calls with respect to the\n" +
             "dice count ratio of the previous player to the whole table")
     plt.legend(loc = "best")
-    plt.show()
+    if filenames == None:
+        plt.show()
+    else:
+        plt.savefig(filenames[0])
+        plt.close()
 
     # Second plot - only plot data for current player's dice ratios
     plt.plot(interval_markers, current_predicted, "bo",  \
@@ -182,8 +207,47 @@ def simulator(player_count, num_trials, num_intervals, cup_sizes):
     plt.title("Success rate of dudo calls with respect to the\n" +
             "dice count ratio of the current player to the whole table\n")
     plt.legend(loc = "best")
-    plt.show()
+    if filenames == None:
+        plt.show()
+    else:
+        plt.savefig(filenames[1])
+        plt.close()
+
+def simulator(player_count, num_trials, num_intervals, cup_sizes,
+                workers=None, seed=None):
+    """
+    Plot statistics on dudo calls based on multiple simulated games of Perudo
+
+    Prints the statistics of each bucket, then creates the two plots
+    described in plot.
+
+    Arguments:
+        player_count (int) - number of players
+        num_trials (int) - number of games to be simulated
+        num_intervals (int) - determines how many intervals to include on the
+            horizontal axis of the plots.
+        cup_sizes (list of ints) - list of cup sizes that you want to be counted
+            during data collection. For example, passing [1, 2] will only
+            count dudo calls when the previous or current player had one or
+            two dice in their cup at the time.
+        workers (int) - number of processes to share the games between
+            (None simulates every game in this process)
+        seed (int) - master random seed; the same seed gives the same
+            results for any number of workers (None picks one at random)
+
+    Note: Plots will have a horizontal axis related to ratio between the
+        dice count of individual players and the dice count of the entire game
+    """
+
+    collector, = harness.run(player_count, num_trials,
+                    [TableRatioCollector(player_count, num_intervals,
+                                            cup_sizes)],
+                    workers, seed)
+
+    print_statistics(collector)
+    plot(collector, num_trials)
 
 
-# simulator(player_count, num_trials, num_intervals, cup_sizes)
-simulator(6, 1000, 200, [1, 2, 3, 4, 5])
+if __name__ == "__main__":
+    # simulator(player_count, num_trials, num_intervals, cup_sizes)
+    simulator(6, 1000, 200, [1, 2, 3, 4, 5])
@@ -0,0 +1,477 @@
+# Charles Dieterle
+# Endgame solver for heads-up Perudo
+# Once two players are left with a few dice each, a round is small enough to
+# solve outright. EndgameTable.solve works out equilibrium strategies for
+# every heads-up round with up to max_dice dice per player, from the
+# smallest rounds up (the loser of a round goes on to a smaller one), and
+# saves them to a file, so later runs start from the file instead of solving
+# again. After endgame.enable(), computer players look their moves up in the
+# table in the heads-up rounds that it covers.
+# Solve a table with Python 3: python endgame.py [max_dice] [file]
+
+import numpy as np
+import os
+import perudo
+import sys
+from itertools import combinations_with_replacement
+from math import factorial
+from time import perf_counter
+
+TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "endgame_table.npz")
+
+# most dice per player that enable() solves rounds for
+MAX_DICE = 3
+
+# number of CFR+ iterations each round is solved with
+ITERATIONS = 1000
+
+# a player's hand is taken to never reach a state if, on average over the
+# iterations, it reaches it with less than this probability (the table has
+# no strategy for it, and the usual calculation picks the move)
+REACH_MIN = 1e-6
+
+def table_config(iterations):
+    """
+    returns the numpy array of the settings that a table's rounds are
+        solved under, saved with the table so that a file solved under other
+        settings isn't used: DIE_SIDES, DICE_PER_PLAYER, iterations and
+        REACH_MIN
+    """
+
+    return np.array([perudo.DIE_SIDES, perudo.DICE_PER_PLAYER, iterations,
+                        REACH_MIN], dtype=np.float64)
+
+def bet_key(num, total):
+    """
+    Rank a bet among the bets of a round
+
+    Bets on 1s go between the bets on 2 * total and 2 * total + 1 of the
+    other numbers, which is where the rules for changing to and from 1s
+    put them.
+
+    returns a tuple that sorts bets from lowest to highest
+    """
+
+    if num == 1:
+        return 2 * total, perudo.DIE_SIDES + 1
+    return total, num
+
+
+def round_bets(dice_count):
+    """returns a list of every (num, total) bet with dice_count dice in play,
+        from lowest to highest"""
+    bets = [(num, total) for num in range(1, perudo.DIE_SIDES + 1)
+                for total in range(1, dice_count + 1)]
+    return sorted(bets, key=lambda bet: bet_key(*bet))
+
+
+def successors(bets, dice_count):
+    """
+    List the bets the solver considers after each bet
+
+    These are the legal bets (from perudo.legal_bets) that rank higher than
+    the bet in play. The bets that check_bet also allows on a higher number
+    with a lower quantity are left out, which keeps every round finite.
+
+    returns a list of lists of indexes into bets: the bets after no bet
+        (every bet), followed by the bets after each bet in bets
+    """
+
+    indexes = {bet: i for i, bet in enumerate(bets)}
+    after = [list(range(len(bets)))]
+    for i, (num, total) in enumerate(bets):
+        legal = [indexes[bet.num, bet.total] for bet in
+                    perudo.legal_bets(dice_count, perudo.Bet(num, total))]
+        after.append(sorted(j for j in legal if j > i))
+    return after
+
+
+def hands(size):
+    """
+    List every hand of size dice
+
+    returns a tuple of (indexes, matching, weights), where indexes is a dict
+        of face count tuples (see perudo.Player.face_counts) and the hands'
+        indexes, matching[h][num] is the number of dice in hand h that count
+        toward a bet on num (column 0 is unused), and weights[h] is the
+        probability of rolling hand h
+    """
+
+    indexes, matching, weights = {}, [], []
+    for cup in combinations_with_replacement(range(1, perudo.DIE_SIDES + 1),
+                                                size):
+        counts = [0] * (perudo.DIE_SIDES + 1)
+        for d in cup:
+            counts[d] += 1
+        ways = factorial(size)
+        for c in counts:
+            ways //= factorial(c)
+        indexes[tuple(counts)] = len(matching)
+        # 1s are wild, as heads-up rounds are never palifico rounds
+        matching.append([0, counts[1]] +
+                        [counts[num] + counts[1]
+                            for num in range(2, perudo.DIE_SIDES + 1)])
+        weights.append(ways / perudo.DIE_SIDES ** size)
+    return indexes, np.array(matching), np.array(weights)
+
+
+def regret_matching(regrets):
+    """returns the strategy for each row of regrets (uniform for a row
+        without positive regrets)"""
+    positive = regrets.clip(0)
+    totals = positive.sum(1, keepdims=True)
+    uniform = np.full_like(positive, 1 / positive.shape[1])
+    return np.divide(positive, totals, out=uniform, where=totals > 0)
+
+
+def solve_round(starter_dice, other_dice, lose_starter, lose_other,
+                iterations=ITERATIONS):
+    """
+    Work out equilibrium strategies for a heads-up round
+
+    The round's information sets are a player's own hand and the bet in
+    play (not the whole history of bets), so the round is a graph of
+    bets rather than a tree. It is solved with CFR+ over that graph
+    (fixed-strategy iteration counterfactual regret minimization): each
+    iteration adds up how often each player reaches each bet from the
+    lowest bet to the highest, then works the values of the moves back down
+    from the highest bet, for every pair of hands at once as arrays.
+
+    Arguments:
+        starter_dice (int) - cup size of the player who opens the round
+        other_dice (int) - cup size of the other player
+        lose_starter (float) - the starter's chance of winning the game if
+            they lose a die this round
+        lose_other (float) - the starter's chance of winning the game if
+            the other player loses a die this round
+        iterations (int) - number of CFR+ iterations
+
+    returns a dict of arrays: the average strategies of the starter and the
+        other player (strategy0 and strategy1, with element [n][h][m] the
+        probability that a player with hand h, after bet n - 1, makes move
+        m: 0 for dudo, and m - 1 for a bet from round_bets; n = 0 is the
+        opening bet), the chances of the opponent holding each hand at each
+        bet (belief0 and belief1), and the starter's chance of winning the
+        game (value)
+    """
+
+    dice_count = starter_dice + other_dice
+    bets = round_bets(dice_count)
+    after = successors(bets, dice_count)
+    nodes = len(bets) + 1
+    indexes0, match0, weight0 = hands(starter_dice)
+    indexes1, match1, weight1 = hands(other_dice)
+    sizes = (len(weight0), len(weight1))
+
+    # the starter's chance of winning the game when each player calls dudo
+    # on each bet, for every pair of hands
+    true = np.array([match0[:, num, None] + match1[None, :, num] >= total
+                        for num, total in bets])
+    dudo = (np.where(true, lose_starter, lose_other),
+            np.where(true, lose_other, lose_starter))
+
+    # moves of each node (n, player): dudo (except for the opening bet),
+    # then the bets after bet n - 1, as columns of the dense strategy
+    columns = [np.array(after[0]) + 1] +  \
+                [np.array([0] + after[n]) + (np.arange(len(after[n]) + 1)
+                                            > 0) for n in range(1, nodes)]
+    players = [(0, 0)] + [(n, p) for n in range(1, nodes) for p in (0, 1)]
+    regrets = {node: np.zeros((sizes[node[1]], len(columns[node[0]])))
+                for node in players}
+    totals = {node: np.zeros_like(regrets[node]) for node in players}
+
+    def play(strategy, update=0):
+        # reach[p][n] is how often player p's hands reach their turn after
+        # bet n - 1, and seen[p][n] is how often the opponent's hands do
+        reach = [np.zeros((nodes, sizes[0])), np.zeros((nodes, sizes[1]))]
+        seen = [np.zeros((nodes, sizes[1])), np.zeros((nodes, sizes[0]))]
+        reach[0][0] = 1
+        seen[0][0] = 1
+        for n, p in players:
+            sigma = strategy(n, p)
+            if update > 0:
+                totals[n, p] += update * reach[p][n][:, None] * sigma
+            children = np.array(after[n], dtype=int) + 1
+            bet_moves = sigma[:, 1:] if n > 0 else sigma
+            reach[1 - p][children] += seen[p][n]
+            seen[1 - p][children] += (reach[p][n][:, None] * bet_moves).T
+
+        # the starter's chance of winning from each node, for every pair of
+        # hands, from the highest bet down
+        values = [np.zeros((nodes,) + sizes), np.zeros((nodes,) + sizes)]
+        for n, p in reversed(players):
+            sigma = strategy(n, p)
+            moves = values[1 - p][np.array(after[n], dtype=int) + 1]
+            if n > 0:
+                moves = np.concatenate((dudo[p][n - 1][None], moves))
+            if p == 0:
+                values[0][n] = np.einsum("hm,mhk->hk", sigma, moves)
+            else:
+                values[1][n] = np.einsum("km,mhk->hk", sigma, moves)
+            if update > 0:
+                # the value of each move to each of the player's hands,
+                # weighed by the chance of the opponent's hands being there
+                if p == 0:
+                    worth = moves.dot(weight1 * seen[0][n]).T
+                else:
+                    worth = -np.einsum("h,mhk->km", weight0 * seen[1][n],
+                                        moves)
+                expected = (sigma * worth).sum(1, keepdims=True)
+                regrets[n, p] = np.maximum(regrets[n, p] + worth - expected,
+                                            0)
+        return reach, seen, values
+
+    strategies = {}
+    for t in range(1, iterations + 1):
+        strategies.clear()
+        for node in players:
+            strategies[node] = regret_matching(regrets[node])
+        play(lambda n, p: strategies[n, p], t)
+
+    # play the average strategies once more, for the beliefs and the value
+    average = {}
+    for node in players:
+        average[node] = regret_matching(totals[node])
+    reach, seen, values = play(lambda n, p: average[n, p])
+
+    table = {"value": np.array(weight0.dot(values[0][0]).dot(weight1))}
+    weights = (weight1, weight0)
+    scale = iterations * (iterations + 1) / 2
+    for p in (0, 1):
+        strategy = np.zeros((nodes, sizes[p], nodes), dtype=np.float32)
+        for n in range(nodes):
+            if (n, p) not in average:
+                continue
+            visited = totals[n, p].sum(1) >= REACH_MIN * scale
+            strategy[n, :, columns[n]] = (average[n, p] *
+                                            visited[:, None]).T
+        belief = weights[p] * seen[p]
+        belief_totals = belief.sum(1, keepdims=True)
+        belief = np.divide(belief, belief_totals,
+                            out=np.zeros_like(belief),
+                            where=belief_totals > 0)
+        table[f"strategy{p}"] = strategy
+        table[f"belief{p}"] = belief.astype(np.float32)
+    return table
+
+
+class EndgameTable():
+    """
+    The solved heads-up rounds, saved to a file
+
+    A round is stored under its canonical state, the cup sizes of the
+    player who opened it and the other player (which players they are, and
+    which round of the game it is, don't matter), and looked up by the bet
+    in play and the hand of the player whose turn it is. Each round's value
+    (the opener's chance of winning the game) is kept with it, as the
+    rounds with more dice are solved from the values of the smaller ones.
+    The file also keeps the settings the rounds were solved under (see
+    table_config), and a file solved under other settings is solved again.
+
+    Attributes:
+        path - str of the file the table is saved to, or None
+        rounds - dict of (starter_dice, other_dice) and the dict of arrays
+                 from solve_round
+        iterations - int representing the CFR+ iterations the rounds were
+                     solved with, or None before any are
+        rng - numpy Generator that moves are drawn from (the strategies
+              are mixed)
+        moves - int representing the number of moves looked up
+    """
+
+    def __init__(self, path=TABLE_FILE, seed=None):
+        self.path = path
+        self.rounds = {}
+        self.iterations = None
+        self.rng = np.random.default_rng(seed)
+        self.moves = 0
+        self._bets = {}
+        self._hands = {}
+        if path != None and os.path.exists(path):
+            with np.load(path) as f:
+                # rounds solved under other settings (or saved before the
+                # settings were) are left out, to be solved again
+                if "config" not in f.files or f["config"].shape != (4,):
+                    return
+                config = f["config"]
+                iterations = int(config[2])
+                if not np.array_equal(config, table_config(iterations)):
+                    return
+                self.iterations = iterations
+                for name in f.files:
+                    if name == "config":
+                        continue
+                    round_name, array = name.split("/")
+                    dice = tuple(map(int, round_name.split("x")))
+                    self.rounds.setdefault(dice, {})[array] = f[name]
+
+    def value(self, starter_dice, other_dice):
+        """returns the chance that the player who opens a round with
+            starter_dice dice wins the game against other_dice dice"""
+        if starter_dice == 0:
+            return 0.0
+        if other_dice == 0:
+            return 1.0
+        return float(self.rounds[starter_dice, other_dice]["value"])
+
+    def solve(self, max_dice=MAX_DICE, iterations=ITERATIONS):
+        """
+        Solve every round up to max_dice dice per player that isn't in the
+        table yet, saving the table after each one. If the table was solved
+        with a different number of iterations, every round is solved again,
+        as the larger rounds are solved from the values of the smaller ones.
+
+        returns a list of tuples of form (starter_dice, other_dice, seconds,
+            information sets, bytes, value), one for each round, with
+            seconds None for the rounds that were already in the table
+        """
+
+        if self.iterations != iterations:
+            self.rounds = {}
+            self.iterations = iterations
+        report = []
+        for dice_count in range(2, 2 * max_dice + 1):
+            for starter_dice in range(max(1, dice_count - max_dice),
+                                        min(max_dice, dice_count - 1) + 1):
+                other_dice = dice_count - starter_dice
+                seconds = None
+                if (starter_dice, other_dice) not in self.rounds:
+                    start = perf_counter()
+                    self.rounds[starter_dice, other_dice] = solve_round(
+                            starter_dice, other_dice,
+                            self.value(starter_dice - 1, other_dice),
+                            1 - self.value(other_dice - 1, starter_dice),
+                            iterations)
+                    seconds = perf_counter() - start
+                    self.save()
+                arrays = self.rounds[starter_dice, other_dice]
+                information_sets = 0
+                for p in (0, 1):
+                    information_sets += int(np.count_nonzero(
+                                    arrays[f"strategy{p}"].any(2)))
+                report.append((starter_dice, other_dice, seconds,
+                                information_sets,
+                                sum(a.nbytes for a in arrays.values()),
+                                self.value(starter_dice, other_dice)))
+        return report
+
+    def save(self):
+        if self.path == None:
+            return
+        arrays = {"config": table_config(self.iterations)}
+        for (starter_dice, other_dice), round_arrays in self.rounds.items():
+            for name, array in round_arrays.items():
+                arrays[f"{starter_dice}x{other_dice}/{name}"] = array
+        # write to a new file first, so an interrupted save can't leave
+        # half a table behind
+        temporary = self.path + ".tmp.npz"
+        np.savez_compressed(temporary, **arrays)
+        os.replace(temporary, self.path)
+
+    def bets(self, dice_count):
+        """returns a tuple of (list of bets from round_bets, dict of bets and
+            their indexes)"""
+        bets = self._bets.get(dice_count)
+        if bets == None:
+            order = round_bets(dice_count)
+            bets = order, {bet: i for i, bet in enumerate(order)}
+            self._bets[dice_count] = bets
+        return bets
+
+    def hands(self, size):
+        table = self._hands.get(size)
+        if table == None:
+            table = hands(size)
+            self._hands[size] = table
+        return table
+
+    def best_move(self, game):
+        """
+        Draw the current player's move from the table's strategy
+
+        returns a tuple of form (move, prob) like perudo.best_move, where
+            prob is the chance of the move succeeding given what the
+            opponent's play so far says about their hand, or None if the
+            round isn't in the table
+        """
+
+        if game.live_players != 2 or game.palifico:
+            return None
+        seat = game.current_player
+        starter = seat
+        if game.bets != []:
+            starter = game.bets[0][0]
+        other = game.next_seat[starter]
+        starter_dice = len(game.players[starter].cup)
+        other_dice = len(game.players[other].cup)
+        arrays = self.rounds.get((starter_dice, other_dice))
+        if arrays == None:
+            return None
+
+        bets, bet_indexes = self.bets(starter_dice + other_dice)
+        n = 0
+        if game.current_bet != None:
+            n = bet_indexes[game.current_bet.num, game.current_bet.total] + 1
+        p = int(seat != starter)
+        current = game.players[seat]
+        indexes, matching, weights = self.hands(len(current.cup))
+        row = arrays[f"strategy{p}"][n][indexes[tuple(current.face_counts)]]
+        cumulative = np.cumsum(row, dtype=np.float64)
+        if cumulative[-1] <= 0:
+            return None
+        move = int(np.searchsorted(cumulative,
+                                    self.rng.random() * cumulative[-1],
+                                    "right"))
+        move = min(move, len(row) - 1)
+        self.moves += 1
+
+        # the chance of a bet being true, from the opponent's hands
+        opponent_dice = other_dice if p == 0 else starter_dice
+        opponent_indexes, opponent_matching, belief = self.hands(opponent_dice)
+        if arrays[f"belief{p}"][n].any():
+            belief = arrays[f"belief{p}"][n]
+        own = current.face_counts[1]
+
+        def chance(num, total):
+            need = total - current.face_counts[num]
+            if num != 1:
+                need -= own
+            return float(belief[opponent_matching[:, num] >= need].sum())
+
+        if move == 0:
+            bet = game.current_bet
+            return "Dudo", 1 - chance(bet.num, bet.total)
+        num, total = bets[move - 1]
+        return perudo.Bet(num, total), chance(num, total)
+
+
+def enable(path=TABLE_FILE, max_dice=MAX_DICE, seed=None):
+    """
+    Have perudo.Game.make_safest_move use an endgame table, solving the
+    rounds up to max_dice dice per player that the file doesn't have yet
+
+    returns the EndgameTable object
+    """
+
+    table = EndgameTable(path, seed)
+    table.solve(max_dice)
+    perudo.endgame_table = table
+    return table
+
+
+def disable():
+    perudo.endgame_table = None
+
+
+if __name__ == "__main__":
+    max_dice = int(sys.argv[1]) if len(sys.argv) > 1 else MAX_DICE
+    path = sys.argv[2] if len(sys.argv) > 2 else TABLE_FILE
+    table = EndgameTable(path)
+    print(f"{'dice':>6} {'solve (s)':>10} {'info sets':>10} {'size (KB)':>10} "\
+            f"{'opener wins':>12}")
+    for starter_dice, other_dice, seconds, information_sets, size, value  \
+            in table.solve(max_dice):
+        solved = "loaded" if seconds == None else f"{seconds:.2f}"
+        print(f"{starter_dice:>2} v {other_dice:<2} {solved:>10} "\
+                f"{information_sets:>10} {size / 1024:>10.1f} {value:>12.1%}")
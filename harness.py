@@ -0,0 +1,179 @@
+# Charles Dieterle
+# Plays simulated games of Perudo (no human players) once, and hands every
+# bet and dudo call to any number of collectors
+# One run can then gather the data for simulation.py, dice_ratio_simulation.py
+# and inter_player_simulation.py, with any number of cup size filters.
+
+import copy
+import parallel
+import perudo
+from accumulators import Collector
+
+def play_games(num_trials, player_count, collectors, cache_size=None):
+    """
+    Simulate games of Perudo, passing every event to the collectors
+
+    Arguments:
+        num_trials (int) - number of games to be simulated
+        player_count (int) - number of players in each game
+        collectors (list) - accumulators.Collector objects
+        cache_size (int) - size to set the perudo move caches to (see
+            perudo.StateCache), or None to leave them as they are
+
+    returns collectors
+    """
+
+    if cache_size != None:
+        perudo.all_bets_cache.resize(cache_size)
+        perudo.best_move_cache.resize(cache_size)
+
+    def record_dudo(outcome):
+        for collector in collectors:
+            collector.record_dudo(outcome)
+
+    for collector in collectors:
+        collector.start_run()
+
+    for i in range(num_trials):
+        my_game = perudo.Game(player_count, observer=record_dudo)
+        for collector in collectors:
+            collector.start_game(my_game)
+
+        while my_game.players_left() > 1:
+            # make_safest_move returns None for a bet (and the outcome of a
+            # dudo call, which has already gone to the collectors)
+            if my_game.make_safest_move() == None:
+                for collector in collectors:
+                    collector.record_bet(my_game)
+
+        for collector in collectors:
+            collector.end_game(my_game)
+
+    for collector in collectors:
+        collector.end_run()
+
+    return collectors
+
+
+class ProfileCollector(Collector):
+    """
+    Counts and times the engine's hot paths while the games are played
+
+    Add one to the collectors of a run to profile it (see
+    perudo.enable_profiling). The profiles of every worker process are
+    merged, and report() prints the result.
+
+    Attributes:
+        profile - perudo.Profile object
+    """
+
+    def __init__(self):
+        self.profile = perudo.Profile()
+
+    def start_run(self):
+        perudo.enable_profiling(self.profile)
+
+    def end_run(self):
+        perudo.disable_profiling()
+
+    def __add__(self, other):
+        merged = ProfileCollector()
+        merged.profile = self.profile + other.profile
+        return merged
+
+    def report(self):
+        self.profile.report()
+
+
+def _play_chunk(num_trials, player_count, collectors, cache_size):
+    """Play one chunk of games into fresh copies of the empty collectors"""
+    return play_games(num_trials, player_count, copy.deepcopy(collectors),
+                        cache_size)
+
+
+def run(player_count, num_trials, collectors, workers=None, seed=None,
+        cache_size=None):
+    """
+    Simulate games of Perudo once for all of the collectors
+
+    Arguments:
+        player_count (int) - number of players in each game
+        num_trials (int) - number of games to be simulated
+        collectors (list) - empty accumulators.Collector objects
+        workers (int) - number of processes to share the games between
+            (None simulates every game in this process)
+        seed (int) - master random seed; the same seed gives the same
+            results for any number of workers (None picks one at random)
+        cache_size (int) - see play_games (set in every worker process)
+
+    returns a list of collectors, in the same order as the list passed in,
+        holding the data of every game
+    """
+
+    return parallel.run_trials(_play_chunk,
+                                (player_count, list(collectors), cache_size),
+                                num_trials, workers, seed)
+
+
+def graph_set(player_count, num_trials, num_intervals, directory,
+                workers=None, seed=None):
+    """
+    Create the whole set of simulation graphs from one simulation
+
+    Saves a plot from dice_ratio_simulation.py and inter_player_simulation.py
+    for each of the cup size filters below, and prints the statistics from
+    simulation.py. The filters are one cup size at a time, all cup sizes,
+    and all cup sizes but 1. Every combination of an offensive and a
+    defensive filter is plotted for inter_player_simulation.py.
+
+    Arguments:
+        player_count (int) - number of players in each game
+        num_trials (int) - number of games to be simulated
+        num_intervals (int) - number of intervals on the horizontal axis
+        directory (str) - folder that the .png files are saved into
+        workers, seed - see run
+
+    Note: files are named after those in the simulation_graphs folder, e.g.
+        previous_2.png or inter_offense_allbut1_defense_all.png
+    """
+
+    import os
+    import dice_ratio_simulation
+    import inter_player_simulation
+    import simulation
+
+    dice = range(1, perudo.DICE_PER_PLAYER + 1)
+    filters = {str(size): [size] for size in dice}
+    filters["all"] = list(dice)
+    filters["allbut1"] = list(dice)[1:]
+
+    collectors = [simulation.SummaryCollector()]
+    for name, sizes in filters.items():
+        collectors.append(dice_ratio_simulation.TableRatioCollector(
+                                        player_count, num_intervals, sizes))
+    for offense, offensive_sizes in filters.items():
+        for defense, defensive_sizes in filters.items():
+            collectors.append(inter_player_simulation.InterPlayerCollector(
+                    num_intervals, offensive_sizes, defensive_sizes))
+
+    collectors = run(player_count, num_trials, collectors, workers, seed)
+
+    collectors[0].report()
+    collectors = collectors[1:]
+    for name in filters:
+        collector = collectors.pop(0)
+        dice_ratio_simulation.plot(collector, num_trials,
+                        (os.path.join(directory, f"previous_{name}.png"),
+                        os.path.join(directory, f"current_{name}.png")))
+    for offense in filters:
+        for defense in filters:
+            collector = collectors.pop(0)
+            print(f"Offense {offense}, defense {defense}:")
+            inter_player_simulation.plot(collector, num_trials,
+                        os.path.join(directory,
+                            f"inter_offense_{offense}_defense_{defense}.png"))
+
+
+if __name__ == "__main__":
+    # graph_set(player_count, num_trials, num_intervals, directory)
+    graph_set(6, 1000, 100, "simulation_graphs")
@@ -0,0 +1,387 @@
+# Charles Dieterle
+# Bid-history-aware probabilities for computer players
+# get_probability treats every die it can't see as a fair roll, but the
+# bets made earlier in a round say something about the bettors' cups: a
+# player usually bets on a number they hold. BidInference weighs random
+# rolls of the opponents' dice by how likely each opponent would have been
+# to make the bets they made with those dice (importance sampling), and
+# scores dudo and every bet from those weighted rolls.
+# Turn it on for computer players with inference.enable()
+
+import numpy as np
+import perudo
+from itertools import combinations_with_replacement, product
+from math import factorial
+from time import perf_counter
+
+# number of weighted rolls drawn for each estimate, at most
+SAMPLES = 4096
+
+# rolls are drawn this many at a time, checking the time limit in between
+BATCH_SIZE = 1024
+
+# seconds one estimate may spend drawing rolls, after its first batch
+TIME_LIMIT = .005
+
+# cup sizes with at most this many ordered rolls draw hands by looking a
+# random roll up in a table, rather than searching the hands' probabilities
+ROLL_TABLE_MAX = 65536
+
+# number of estimates (one for each cup size, set of bets, palifico setting
+# and transform length) that a BidInference remembers
+ESTIMATE_CACHE_SIZE = 4096
+
+# how strongly a bet points to the bettor's dice. A player is modeled to bet
+# on each number with weight exp(BID_STRENGTH * m), where m is how many of
+# their dice count toward that number (0 would ignore the bets). At 1.25, the
+# predicted success of dudo calls matches their actual success in 6 player
+# games where every player uses BidInference (56% and 57%).
+BID_STRENGTH = 1.25
+
+def matches(counts, wild):
+    """
+    Count the dice that match each number
+
+    Arguments:
+        counts (array) - shape (rolls, DIE_SIDES), the number of dice
+            showing each number (column 0 for 1s)
+        wild (bool) - True if 1s count toward the other numbers
+
+    returns an array of the same shape
+    """
+
+    if not wild:
+        return counts
+    matching = counts + counts[:, :1]
+    matching[:, 0] = counts[:, 0]
+    return matching
+
+
+class BidInference():
+    """
+    Estimates move probabilities from the bets made so far in a round
+
+    Each opponent's hand is independent of the others', and only depends on
+    their own bets. So for each opponent who has bet, their hand is rolled
+    SAMPLES times at once as arrays, and each roll is weighted by the
+    probability that they would have bet on the numbers they did with it.
+    That gives the chance of them holding each count of matching dice for
+    every number. The dice of opponents who haven't bet are fair rolls, so
+    they are taken from the binomial tail table instead. The two are added
+    up (as a product of Fourier transforms), and every move is scored from
+    the result.
+
+    An estimate only depends on an opponent's cup size, bets and the
+    palifico setting, which repeat from round to round and game to game, so
+    estimates are kept in a cache and rolls are only drawn for a new one.
+
+    The probabilities are not adjusted by dudo_dial, which stands in for the
+    information in the bets that the uniform model leaves out.
+
+    Attributes:
+        samples - int representing the most rolls per estimate
+        time_limit - float representing the seconds an estimate may take
+            (None for no limit)
+        strength - float representing BID_STRENGTH
+        rng - numpy Generator that the rolls are drawn from
+        cache - perudo.StateCache of the estimates from the bettor and
+            spectrum methods
+        moves - int representing the number of moves worked out
+        fallbacks - int representing the number of moves left to the usual
+            calculation, as no opponent had bet yet
+        rolls - int representing the number of rolls drawn
+    """
+
+    def __init__(self, samples=SAMPLES, time_limit=TIME_LIMIT,
+                    strength=BID_STRENGTH, seed=None,
+                    cache_size=ESTIMATE_CACHE_SIZE):
+        self.samples = samples
+        self.time_limit = time_limit
+        self.strength = strength
+        self.rng = np.random.default_rng(seed)
+        self.tables = {}
+        self.cache = perudo.StateCache(cache_size)
+        self.moves = 0
+        self.fallbacks = 0
+        self.rolls = 0
+
+    def opponents(self, game):
+        """
+        Get the opponents of the current player and the numbers they bet on
+
+        returns a list of tuples of form (cup size, list of ints), one for
+            each opponent with dice, in seat order after the current player
+        """
+
+        current = game.current_player
+        numbers = {}
+        for seat, bet in game.bets:
+            if seat != current:
+                numbers.setdefault(seat, []).append(bet.num)
+
+        opponents = []
+        seat = game.next_seat[current]
+        while seat != current:
+            opponents.append((len(game.players[seat].cup),
+                                numbers.get(seat, [])))
+            seat = game.next_seat[seat]
+        return opponents
+
+    def hands(self, size):
+        """
+        Get the table of every hand of size dice, for drawing bettors' hands
+
+        returns a tuple of arrays (counts, cdf, rolls, scores), where
+            counts[h] is the number of dice showing each number in hand h
+            (column 0 for 1s), cdf is the running total of the hands'
+            probabilities, rolls[i] is the hand of the i-th ordered roll of
+            size dice (None if there are more than ROLL_TABLE_MAX), and
+            scores[palifico][h][num - 1] is the log of the probability that
+            a player with hand h bets on num
+        """
+
+        table = self.tables.get(size)
+        if table != None:
+            return table
+
+        counts, probs, indexes = [], [], {}
+        for cup in combinations_with_replacement(range(perudo.DIE_SIDES),
+                                                    size):
+            hand = [0] * perudo.DIE_SIDES
+            for d in cup:
+                hand[d] += 1
+            ways = factorial(size)
+            for c in hand:
+                ways //= factorial(c)
+            indexes[cup] = len(counts)
+            counts.append(hand)
+            probs.append(ways / perudo.DIE_SIDES ** size)
+        counts = np.array(counts, dtype=np.int64)
+
+        rolls = None
+        if perudo.DIE_SIDES ** size <= ROLL_TABLE_MAX:
+            rolls = np.array([indexes[tuple(sorted(roll))] for roll in
+                                product(range(perudo.DIE_SIDES), repeat=size)])
+
+        scores = []
+        for palifico in (False, True):
+            score = self.strength * matches(counts, not palifico)
+            top = score.max(1, keepdims=True)
+            score = score - top -  \
+                    np.log(np.exp(score - top).sum(1, keepdims=True))
+            scores.append(score)
+
+        cdf = np.cumsum(probs)
+        cdf[-1] = 1
+        table = counts, cdf, rolls, scores
+        self.tables[size] = table
+        return table
+
+    def bettor(self, size, numbers, palifico):
+        """
+        Estimate how many dice of each number a player who has bet holds
+
+        Rolls the player's hand many times over, weighting each roll by the
+        likelihood of the player's bets with it.
+
+        Arguments:
+            size (int) - the player's cup size
+            numbers (tuple of ints) - the numbers the player bet on this
+                round, from smallest to largest
+            palifico (bool) - True if palifico rules are in play
+
+        returns an array of shape (DIE_SIDES, size + 1), where element
+            [num - 1][m] is the probability that m of the player's dice
+            count toward a bet on num
+        """
+
+        key = (size, numbers, palifico)
+        histogram = self.cache.get(key)
+        if histogram is not None:
+            return histogram
+
+        counts, cdf, rolls, scores = self.hands(size)
+        log_likelihood = scores[palifico][:, np.array(numbers) - 1].sum(1)
+        matching = matches(counts, not palifico) +  \
+                    np.arange(perudo.DIE_SIDES) * (size + 1)
+
+        histogram = np.zeros(perudo.DIE_SIDES * (size + 1))
+        drawn = 0
+        start = perf_counter()
+        while drawn < self.samples:
+            batch = min(BATCH_SIZE, self.samples - drawn)
+            draw = self.rng.random(batch)
+            if rolls is not None:
+                hands = rolls.take((draw * len(rolls)).astype(np.intp))
+            else:
+                hands = np.searchsorted(cdf, draw)
+
+            # each roll is weighted by how likely the bets were with it,
+            # and its matching dice of every number are counted at once
+            weight = np.exp(log_likelihood.take(hands))
+            histogram += np.bincount(matching.take(hands, 0).ravel(),
+                                    np.repeat(weight, perudo.DIE_SIDES),
+                                    len(histogram))
+            drawn += batch
+
+            if self.time_limit != None and  \
+                    perf_counter() - start > self.time_limit:
+                break
+
+        self.rolls += drawn
+        histogram = histogram.reshape(perudo.DIE_SIDES, size + 1)
+        histogram /= histogram[0].sum()
+        self.cache.put(key, histogram)
+        return histogram
+
+    def spectrum(self, size, numbers, palifico, length):
+        """
+        Get the Fourier transform of a player's matching dice counts
+
+        Adding up the dice of independent players convolves their
+        distributions, which is a product of their transforms.
+
+        Arguments:
+            size (int) - the player's cup size (or the total cup size of
+                every player who hasn't bet)
+            numbers (tuple of ints) - see bettor (empty if the players
+                haven't bet, so that their dice are fair rolls)
+            palifico (bool) - True if palifico rules are in play
+            length (int) - the length of the transform, more than the
+                number of dice of every player added up
+
+        returns an array of shape (DIE_SIDES, length // 2 + 1)
+        """
+
+        key = (size, numbers, palifico, length)
+        spectrum = self.cache.get(key)
+        if spectrum is not None:
+            return spectrum
+
+        if numbers == ():
+            # fair rolls, from the binomial tail table
+            rows = []
+            for num in range(1, perudo.DIE_SIDES + 1):
+                row = np.array(perudo.tail_row(size,
+                                        num != 1 and not palifico)[:size + 1])
+                row[:-1] -= row[1:]
+                rows.append(row)
+            histogram = np.array(rows)
+        else:
+            histogram = self.bettor(size, numbers, palifico)
+        spectrum = np.fft.rfft(histogram, length)
+        self.cache.put(key, spectrum)
+        return spectrum
+
+    def tails(self, opponents, palifico):
+        """
+        Estimate how many dice the opponents hold of each number
+
+        The opponents' hands are independent, so each bettor's estimate
+        (from the bettor method) is worked out on its own and combined with
+        the others, and the dice of the opponents who haven't bet are added
+        in exactly, from the binomial tail table.
+
+        Arguments:
+            opponents (list) - from the opponents method
+            palifico (bool) - True if palifico rules are in play
+
+        returns a tuple of DIE_SIDES tuples of floats, where
+            tails[num - 1][r] is the probability that the opponents hold at
+            least r dice that count toward a bet on num, for r from 0 to
+            their number of dice
+        """
+
+        n = sum(size for size, numbers in opponents)
+        length = 1 << n.bit_length()
+        quiet = sum(size for size, numbers in opponents if numbers == [])
+        spectrum = self.spectrum(quiet, (), palifico, length)
+        for size, numbers in opponents:
+            if numbers != []:
+                spectrum = spectrum * self.spectrum(size,
+                                        tuple(sorted(numbers)), palifico,
+                                        length)
+
+        total = np.fft.irfft(spectrum, length)[:, :n + 1]
+        tails = np.cumsum(total[:, ::-1], 1)[:, ::-1].clip(0, 1)
+        return tuple(map(tuple, tails.tolist()))
+
+    def move_probabilities(self, game):
+        """
+        Score every move of the current player, like perudo.get_all_bets
+
+        returns a list of tuples of form (move, prob) in the same order as
+            get_all_bets, or None if no opponent has bet yet this round
+            (then every unknown die is a fair roll, and get_all_bets is
+            already exact)
+        """
+
+        opponents = self.opponents(game)
+        if all(numbers == [] for size, numbers in opponents):
+            self.fallbacks += 1
+            return None
+        self.moves += 1
+
+        current = game.get_current_player()
+        face_counts = current.face_counts
+        palifico = game.palifico
+        bet_state = game.current_bet
+
+        tails = self.tails(opponents, palifico)
+        n = game.dice_count - len(current.cup)
+
+        # the probability that a bet on num for total dice is true
+        def chance(num, total):
+            need = total - face_counts[num]
+            if num != 1 and not palifico:
+                need -= face_counts[1]
+            if need <= 0:
+                return 1.0
+            if need > n:
+                return 0.0
+            return tails[num - 1][need]
+
+        move_list = []
+        if bet_state != None:
+            move_list.append(("Dudo",
+                                1 - chance(bet_state.num, bet_state.total)))
+        for num, total, dialed in perudo.bet_candidates(game.dice_count,
+                                                        bet_state, palifico):
+            move_list.append((perudo.Bet(num, total), chance(num, total)))
+        return move_list
+
+    def best_move(self, game):
+        """
+        Find the move with the highest estimated probability of success
+
+        A tie goes to the later move, like perudo.best_move.
+
+        returns a tuple of form (move, prob), or None to leave the move to
+            the usual calculation
+        """
+
+        move_list = self.move_probabilities(game)
+        if move_list == None:
+            return None
+        best, highest_prob = None, 0
+        for move, prob in move_list:
+            if prob >= highest_prob:
+                best, highest_prob = move, prob
+        return best, highest_prob
+
+
+def enable(estimator=None):
+    """
+    Have perudo.Game.make_safest_move use a BidInference estimator
+
+    returns the estimator (a new BidInference if none is given)
+    """
+
+    if estimator == None:
+        estimator = BidInference()
+    perudo.move_estimator = estimator
+    return estimator
+
+
+def disable():
+    perudo.move_estimator = None
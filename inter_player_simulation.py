@@ -3,24 +3,21 @@
 # Plots data about dudo success, relative to dice count ratios between players
 # See rules.txt for an English language explanation of the rules
 
+import harness
 import perudo
+from accumulators import BucketStats, Collector
 from matplotlib import pyplot as plt
 import numpy as np
 from math import sqrt
 
-def simulator(player_count, num_trials, num_intervals,
-                            offensive_cup_sizes, defensive_cup_sizes):
+def ratio_range(num_intervals):
     """
-    Plot statistics on dudo calls based on multiple simulated games of Perudo
+    Get the range of offensive-to-defensive dice ratios and a bucket's width
 
     Arguments:
-        -- player_count (int) - number of players
-        -- num_trials (int) - number of games to be simulated
-        -- num_intervals (int) - # of intervals on the horizontal axis of plots
-        -- offensive_cup_sizes (list of ints) - list of cup sizes to be counted during data collection. For example, passing [1, 2] will only count dudo calls when the offensive player has one or two dice in their cup at the time of calling dudo.
-        -- defensive_cup_sizes (list of ints) - same as offensive_cup_sizes, but for the defensive player
+        num_intervals (int) - number of buckets the range is divided into
 
-    Note: Horizontal axis of plot is a ratio of dice counts, offensive/defensive
+    returns a tuple of floats (min_ratio, max_ratio, step)
     """
 
     dice_per_player = perudo.DICE_PER_PLAYER
@@ -32,97 +29,128 @@ def simulator(player_count, num_trials, num_intervals,
     ratio_diff = max_ratio - min_ratio
     step = ratio_diff / num_intervals
 
-    # The data will be grouped on the x axis by ratios of dice counts.
-    # Therefore, it's necessary to convert the ratios into integer bucket
-    # numbers that represent ranges of ratios. These buckets will be used as
-    # index numbers for lists that gather the data.
-    def get_bucket(ratio):
-        """
-        Get the appropriate bucket number from a given ratio
-
-        If the ratio is min_ratio, the bucket is 0, and if it is max_ratio,
-        the bucket is num_intervals - 1. The range of each bucket is
-        the value of the variable step, which is ratio_diff / num_intervals
-        """
-        if ratio == max_ratio:
-            return num_intervals - 1
-        else:
-            return int((ratio - min_ratio) / step)
+    return min_ratio, max_ratio, step
 
-    # The lists below will each have num_intervals empty-list elements, into
-    # which the predicted rates of dudo and actual dudo outcomes will be placed
-    # based on the ratio of dice counts between players
-    predicted, actual = [], []
-    correct, incorrect = 0, 0  # counts how many dudo calls were correct
+# The data will be grouped on the x axis by ratios of dice counts.
+# Therefore, it's necessary to convert the ratios into integer bucket
+# numbers that represent ranges of ratios. These buckets will be used as
+# index numbers for lists that gather the data.
+def get_bucket(ratio, num_intervals):
+    """
+    Get the appropriate bucket number from a given ratio
 
-    for i in range(num_intervals):
-        predicted.append([])
-        actual.append([])
+    If the ratio is min_ratio, the bucket is 0, and if it is max_ratio,
+    the bucket is num_intervals - 1. The range of each bucket is
+    the value of the variable step, which is ratio_diff / num_intervals
+    """
+    min_ratio, max_ratio, step = ratio_range(num_intervals)
+    if ratio == max_ratio:
+        return num_intervals - 1
+    else:
+        return int((ratio - min_ratio) / step)
+
+class InterPlayerCollector(Collector):
+    """
+    Totals up dudo calls in buckets of offensive-to-defensive dice ratios
+
+    Attributes:
+        num_intervals (int) - number of buckets
+        offensive_cup_sizes, defensive_cup_sizes (lists of ints) - see
+            simulator
+        predicted (BucketStats) - the predicted success of each dudo call
+        actual (BucketStats) - the outcome of each dudo call (1 if it
+            succeeded, 0 if not)
+        correct (int) - the number of successful dudo calls
+        incorrect (int) - the number of unsuccessful dudo calls
+    """
 
-    # run the simulations
-    for i in range(num_trials):
-        my_game = perudo.Game(player_count)
-        defensive_player = None
+    def __init__(self, num_intervals, offensive_cup_sizes, defensive_cup_sizes):
+        self.num_intervals = num_intervals
+        self.offensive_cup_sizes = offensive_cup_sizes
+        self.defensive_cup_sizes = defensive_cup_sizes
+        self.predicted = BucketStats(num_intervals)
+        self.actual = BucketStats(num_intervals)
+        self.correct, self.incorrect = 0, 0
 
-        while my_game.players_left() > 1:
-            betting_player = my_game.current_player
-            offensive_cup_len = len(my_game.players[betting_player].cup)
-            if defensive_player != None:
-                defensive_cup_len = len(my_game.players[defensive_player].cup)
+    def record_dudo(self, outcome):
+        offensive_cup_len = outcome.caller_dice
+        defensive_cup_len = outcome.defender_dice
 
-            # This will mutate the state of my_game, including current_player
-            safest_move = my_game.make_safest_move()
+        if offensive_cup_len not in self.offensive_cup_sizes:
+            return
 
-            # when dudo is called, add data to the predicted/actual lists
-            if my_game.current_bet == None:
-                ratio = offensive_cup_len / defensive_cup_len
+        if defensive_cup_len not in self.defensive_cup_sizes:
+            return
 
-                if offensive_cup_len not in offensive_cup_sizes:
-                    continue
+        ratio = offensive_cup_len / defensive_cup_len
+        bucket = get_bucket(ratio, self.num_intervals)
 
-                if defensive_cup_len not in defensive_cup_sizes:
-                    continue
+        # If dudo was successful, add 1 to the appropriate bucket
+        if outcome.successful:
+            self.actual.add(bucket, 1)
+            self.correct += 1
+        else:
+            self.actual.add(bucket, 0)
+            self.incorrect += 1
+
+        # note: outcome.probability is the calculated
+        # probability of a dudo call succeeding
+        self.predicted.add(bucket, outcome.probability)
+
+    def __add__(self, other):
+        merged = InterPlayerCollector(self.num_intervals,
+                    self.offensive_cup_sizes, self.defensive_cup_sizes)
+        merged.predicted = self.predicted + other.predicted
+        merged.actual = self.actual + other.actual
+        merged.correct = self.correct + other.correct
+        merged.incorrect = self.incorrect + other.incorrect
+        return merged
+
+def print_statistics(collector):
+    """
+    Print the avg. predicted and actual success of dudo in each bucket,
+    with their standard deviations
 
-                bucket = get_bucket(ratio)
+    Arguments:
+        collector (InterPlayerCollector) - the data from the simulated games
+    """
+
+    for i in range(collector.num_intervals):
+        bucket_size = collector.predicted.counts[i]
+
+        # If the count is 0, there were no dudo calls in that ratio range,
+        # and therefore no data.
+        if bucket_size != 0:
+            print(f"Interval number {i} statistics:\n")
+            print(f"Predicted success: {collector.predicted.mean(i):.2f} "\
+                f"(std. dev. {collector.predicted.std(i):.2f})\n"\
+                f"Actual success: {collector.actual.mean(i):.2f} "\
+                f"(std. dev. {collector.actual.std(i):.2f})")
+            print(f"Sample size: {bucket_size}\n")
 
-                # If dudo was successful, append 1 to appropriate buckets,
-                # else append 0
-                if betting_player != my_game.current_player or my_game.players[defensive_player].cup == []:
-                    actual[bucket].append(1)
-                    correct += 1
-                else:
-                    actual[bucket].append(0)
-                    incorrect += 1
+def plot(collector, num_trials, filename=None):
+    """
+    Plot the avg. predicted and actual success of dudo in each bucket
 
-                # note: safest_move is the calculated
-                # probability of a dudo call succeeding
-                predicted[bucket].append(safest_move)
+    Also prints the standard deviation of the predictions from the actual
+    success rates, and the overall success rate of dudo calls
 
-                defensive_player = None
+    Arguments:
+        collector (InterPlayerCollector) - the data from the simulated games
+        num_trials (int) - number of games that were simulated
+        filename (str) - file to save the plot to, instead of showing it
+    """
 
-            # in this case, dudo wasn't called, so just go to the next turn
-            else:
-                defensive_player = betting_player
+    num_intervals = collector.num_intervals
+    predicted_stats, actual_stats = collector.predicted, collector.actual
+    correct, incorrect = collector.correct, collector.incorrect
+    min_ratio, max_ratio, step = ratio_range(num_intervals)
 
+    # take the average of all data points in each bucket (None if empty)
+    predicted, actual = [], []
     for i in range(num_intervals):
-        bucket_size = len(actual[i])
-        if bucket_size != 0:  # take average of all data points in the bucket
-            predicted[i] = sum(predicted[i]) / bucket_size
-            actual[i] = sum(actual[i]) / bucket_size
-
-        
-        if predicted[i] != []:
-            # uncomment following code to print statistics for each bucket
-            """
-            print(f"Interval number {i} statistics:\n")
-            print(f"Predicted success: {predicted[i]:.2f}\n"
-                f"Actual success: {actual[i]:.2f}")
-            print(f"Sample size: {bucket_size}\n\n")
-            """
-            # comment out following line if above code is in use
-            pass
-        else:
-            predicted[i], actual[i] = None, None
+        predicted.append(predicted_stats.mean(i))
+        actual.append(actual_stats.mean(i))
 
     # create array of values to act as x-axis markers
     interval_markers = []
@@ -141,6 +169,10 @@ def simulator(player_count, num_trials, num_intervals,
         except ValueError:
             break
 
+    if predicted == []:
+        print("No dudo calls matched the cup sizes.\n")
+        return
+
     # plot all collected data
     plt.plot(interval_markers, predicted, "go", label="Predicted dudo success rate")
     plt.plot(interval_markers, actual, "mo", label="Actual dudo success rate")
@@ -152,9 +184,10 @@ def simulator(player_count, num_trials, num_intervals,
             "Dudo dial is a linear value (.09 * dice_ratio - .29)")
 
     # make linear regression line for the actual dudo success rates
-    coef = np.polyfit(interval_markers, actual, 1)
-    linreg_func = np.poly1d(coef)
-    plt.plot(interval_markers, linreg_func(interval_markers), "--b", label = f"Regression Slope = {coef[0]:.4f}, Intercept = {coef[1]:.3f}")
+    if len(interval_markers) > 1:
+        coef = np.polyfit(interval_markers, actual, 1)
+        linreg_func = np.poly1d(coef)
+        plt.plot(interval_markers, linreg_func(interval_markers), "--b", label = f"Regression Slope = {coef[0]:.4f}, Intercept = {coef[1]:.3f}")
 
     # calculate error between predicted and actual dudo rates
     sq_error = 0
@@ -168,9 +201,40 @@ def simulator(player_count, num_trials, num_intervals,
 
     # show plot
     plt.legend(loc = "best")
-    plt.show()
+    if filename == None:
+        plt.show()
+    else:
+        plt.savefig(filename)
+        plt.close()
+
+def simulator(player_count, num_trials, num_intervals,
+                            offensive_cup_sizes, defensive_cup_sizes,
+                            workers=None, seed=None):
+    """
+    Plot statistics on dudo calls based on multiple simulated games of Perudo
+
+    Arguments:
+        -- player_count (int) - number of players
+        -- num_trials (int) - number of games to be simulated
+        -- num_intervals (int) - # of intervals on the horizontal axis of plots
+        -- offensive_cup_sizes (list of ints) - list of cup sizes to be counted during data collection. For example, passing [1, 2] will only count dudo calls when the offensive player has one or two dice in their cup at the time of calling dudo.
+        -- defensive_cup_sizes (list of ints) - same as offensive_cup_sizes, but for the defensive player
+        -- workers (int) - number of processes to share the games between (None simulates every game in this process)
+        -- seed (int) - master random seed; the same seed gives the same results for any number of workers (None picks one at random)
+
+    Note: Horizontal axis of plot is a ratio of dice counts, offensive/defensive
+    """
+
+    collector, = harness.run(player_count, num_trials,
+                    [InterPlayerCollector(num_intervals, offensive_cup_sizes,
+                                            defensive_cup_sizes)],
+                    workers, seed)
+
+    print_statistics(collector)
+    plot(collector, num_trials)
 
 
-# simulator(player_count, num_trials, num_intervals,
-#           offensive_cup_sizes, defensive_cup_sizes)
-simulator(6, 1000, 100, [2, 3, 4, 5], [1, 2, 3, 4, 5])
+if __name__ == "__main__":
+    # simulator(player_count, num_trials, num_intervals,
+    #           offensive_cup_sizes, defensive_cup_sizes)
+    simulator(6, 1000, 100, [2, 3, 4, 5], [1, 2, 3, 4, 5])
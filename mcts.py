@@ -0,0 +1,391 @@
+# Charles Dieterle
+# Monte Carlo tree search player for Perudo
+# Game.make_safest_move only looks one move ahead. MCTSPlayer looks ahead to
+# the end of the round: it plays the round out thousands of times, each time
+# with the other players' dice rolled at random (as it can't see them), and
+# picks the move that kept it from losing a die most often (information set
+# Monte Carlo tree search).
+# Play a tournament against the usual computer players with Python 3:
+# python mcts.py [games] [player_count] [seconds per move]
+
+import math
+import perudo
+import random
+import sys
+from time import perf_counter
+
+# seconds a move may take, if no budget is given
+TIME_LIMIT = 1.0
+
+# how much the search favors moves it has tried less (the UCB1 constant)
+EXPLORATION = .7
+
+class Node():
+    """
+    A state of the round in the search tree, reached by one move
+
+    Attributes:
+        move - "Dudo" or (num, total), the move that reached this node
+        player - int representing the player who made the move
+        bet - (num, total) of the bet in play after the move (for a dudo
+            call, the bet that was called), or None at the start of a round
+        next_player - int representing the player whose turn it is next
+        children - dict of moves and the Node each one reaches
+        untried - list of the moves that don't have a child yet
+        visits - int representing the number of playouts through the node
+        wins - int representing the number of those playouts in which
+            player didn't lose a die
+    """
+
+    __slots__ = ["move", "player", "bet", "next_player", "children",
+                    "untried", "visits", "wins"]
+
+    def __init__(self, move, player, bet, next_player, untried):
+        self.move = move
+        self.player = player
+        self.bet = bet
+        self.next_player = next_player
+        self.children = {}
+        self.untried = untried
+        self.visits = 0
+        self.wins = 0
+
+
+class MCTSPlayer():
+    """
+    A computer player that searches the rest of the round for its move
+
+    Each playout rolls the other players' cups at random, walks down the
+    tree, adds one new node, and plays the rest of the round out with every
+    player making their safest move (perudo.best_move) with their own dice.
+    On the way down, the searching player chooses their moves by UCB1 from
+    the ones computer players consider (perudo.bet_candidates, and dudo),
+    and the other players make their safest move with their rolled dice.
+    (Letting them choose by UCB1 as well would have them learn from
+    playouts that all share the searching player's real cup, as if they
+    could see it.) A playout scores a win for each player on its path who
+    didn't lose the die.
+
+    The search is anytime: it stops when the time or node budget runs out,
+    and best_move gives the move with the most playouts so far at any
+    point. The tree is kept between turns, so when the same player moves
+    again in the same round, the search carries on from the node the bets
+    since then lead to.
+
+    Attributes:
+        time_limit - float representing the seconds each move may take (None
+            for no limit)
+        node_limit - int representing the most playouts for each move (None
+            for no limit). Each move gets at least one playout.
+        exploration - float representing EXPLORATION
+        dice - perudo.DiceSource object for the other players' dice
+        root - Node of the position being searched, or None
+        stats - dict of the last search's playouts, nodes added, seconds,
+            playouts per second and the playouts kept from earlier turns
+    """
+
+    def __init__(self, time_limit=TIME_LIMIT, node_limit=None,
+                    exploration=EXPLORATION, seed=None):
+        if time_limit == None and node_limit == None:
+            raise ValueError("MCTSPlayer needs a time or node limit.")
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.exploration = exploration
+        self.dice = perudo.DiceSource(seed)
+        self.root = None
+        self.stats = {}
+
+        # what the tree was built for: the game, round, player and bets
+        self._game = None
+        self._round = None
+        self._seat = None
+        self._bets = 0
+
+    def moves(self, bet):
+        """
+        List the moves to consider with a bet in play
+
+        returns a list of "Dudo" and (num, total) tuples
+        """
+
+        bet_state = None
+        moves = []
+        if bet != None:
+            bet_state = perudo.Bet(bet[0], bet[1])
+            moves.append("Dudo")
+        # the candidates can double a bet off 1s past the dice in play,
+        # which the game wouldn't allow
+        for num, total, dialed in perudo.bet_candidates(self.dice_count,
+                                                bet_state, self.palifico):
+            if total <= self.dice_count:
+                moves.append((num, total))
+        return moves
+
+    def find_root(self, game):
+        """
+        Get the node to search from, reusing the tree if it is for the same
+        round and player, and every bet since is in it
+
+        returns a tuple of (Node, bool), True if the node was reused
+        """
+
+        if self._game is game and self._round == game.round and  \
+                self._seat == game.current_player and self.root != None:
+            node = self.root
+            for seat, bet in game.bets[self._bets:]:
+                node = node.children.get((bet.num, bet.total))
+                if node == None:
+                    break
+            if node != None:
+                return node, True
+
+        bet = None
+        if game.current_bet != None:
+            bet = (game.current_bet.num, game.current_bet.total)
+        return Node(None, None, bet, game.current_player,
+                    self.moves(bet)), False
+
+    def search(self, game):
+        """
+        Search for the current player's move, until the budget runs out
+
+        returns the root Node
+        """
+
+        self.dice_count = game.dice_count
+        self.palifico = game.palifico
+        cups = [p.cup for p in game.players]
+        self.next_seat = game.next_seat
+        self.previous_seat = game.previous_seat
+        seat = game.current_player
+
+        root, reused = self.find_root(game)
+        self.root = root
+        self._game, self._round, self._seat = game, game.round, seat
+        self._bets = len(game.bets)
+        carried = root.visits
+
+        playouts = 0
+        nodes = 0
+        start = perf_counter()
+        while True:
+            # the first playout always runs, so the root has a move to make
+            # however small the budget is
+            if playouts > 0 and self.node_limit != None and  \
+                    playouts >= self.node_limit:
+                break
+            if playouts > 0 and self.time_limit != None and  \
+                    perf_counter() - start >= self.time_limit:
+                break
+
+            # roll every other player's dice, keeping their cup sizes
+            rolled = []
+            for i in range(len(cups)):
+                if i == seat:
+                    rolled.append(cups[i])
+                else:
+                    rolled.append(self.dice.roll(len(cups[i])))
+
+            # walk down the tree: this player chooses by UCB1 once every
+            # move has been tried, and the others make their safest move
+            # with their rolled dice, so they can't see this player's cup
+            node = root
+            path = [root]
+            while node.move != "Dudo":
+                if node.next_player != seat:
+                    move = self.policy(rolled, node.bet, node.next_player)
+                    child = node.children.get(move)
+                    if child == None:
+                        node = self.add_child(node, move)
+                        path.append(node)
+                        nodes += 1
+                        break
+                    node = child
+                elif node.untried != []:
+                    move = node.untried.pop(
+                                    self.dice.randrange(len(node.untried)))
+                    node = self.add_child(node, move)
+                    path.append(node)
+                    nodes += 1
+                    break
+                else:
+                    node = self.select(node)
+                path.append(node)
+
+            if node.move == "Dudo":
+                loser = self.resolve(rolled, node.bet, node.player)
+            else:
+                loser = self.rollout(rolled, node.bet, node.next_player)
+
+            for n in path:
+                n.visits += 1
+                if n.player != loser:
+                    n.wins += 1
+            playouts += 1
+
+        seconds = perf_counter() - start
+        self.stats = {"playouts": playouts, "nodes": nodes,
+                        "seconds": seconds,
+                        "per_second": playouts / max(seconds, 1e-9),
+                        "reused": carried}
+        return root
+
+    def add_child(self, node, move):
+        if move == "Dudo":
+            child = Node(move, node.next_player, node.bet, None, [])
+        else:
+            next_player = self.next_seat[node.next_player]
+            untried = []
+            if next_player == self._seat:
+                untried = self.moves(move)
+            child = Node(move, node.next_player, move, next_player, untried)
+        node.children[move] = child
+        return child
+
+    def select(self, node):
+        """returns the child of node with the highest UCB1 score"""
+        log_visits = math.log(node.visits)
+        best, best_score = None, None
+        for child in node.children.values():
+            score = child.wins / child.visits + self.exploration *  \
+                    math.sqrt(log_visits / child.visits)
+            if best_score == None or score > best_score:
+                best, best_score = child, score
+        return best
+
+    def resolve(self, cups, bet, caller):
+        """
+        Settle a dudo call with the rolled cups
+
+        returns the int of the player who loses a die
+        """
+
+        num, total = bet
+        actual_total = 0
+        for cup in cups:
+            for d in cup:
+                if d == num or (d == 1 and not self.palifico):
+                    actual_total += 1
+        if total > actual_total:
+            return self.previous_seat[caller]
+        return caller
+
+    def policy(self, cups, bet, player):
+        """
+        Get a player's safest move (perudo.best_move) with the rolled cups
+
+        returns "Dudo" or (num, total)
+        """
+
+        bet_state = None
+        if bet != None:
+            bet_state = perudo.Bet(bet[0], bet[1])
+        move, prob = perudo.best_move(self.dice_count,
+                            len(cups[self.previous_seat[player]]),
+                            len(cups[self.next_seat[player]]),
+                            cups[player], bet_state, self.palifico)
+        if move != None and move != "Dudo" and move.total > self.dice_count:
+            move = None
+        if move == "Dudo" or (move == None and bet != None):
+            return "Dudo"
+        if move == None:
+            return self.moves(None)[0]
+        return (move.num, move.total)
+
+    def rollout(self, cups, bet, player):
+        """
+        Play the rest of the round out, every player making their safest move
+
+        returns the int of the player who loses a die
+        """
+
+        while True:
+            move = self.policy(cups, bet, player)
+            if move == "Dudo":
+                return self.resolve(cups, bet, player)
+            bet = move
+            player = self.next_seat[player]
+
+    def best_move(self):
+        """
+        Get the move with the most playouts so far
+
+        returns "Dudo" or a Bet object, or None before any search
+        """
+
+        if self.root == None or self.root.children == {}:
+            return None
+        move = max(self.root.children.values(),
+                    key=lambda child: (child.visits, child.wins)).move
+        if move == "Dudo":
+            return move
+        return perudo.Bet(move[0], move[1])
+
+    def make_move(self, game):
+        """
+        Search, then make the best move in the game
+
+        returns the DudoOutcome of a dudo call, or None for a bet (like
+            Game.make_safest_move)
+        """
+
+        self.search(game)
+        move = self.best_move()
+        if move == "Dudo":
+            child = self.root.children["Dudo"]
+            return game.dudo(child.wins / child.visits)
+        game.make_bet(move.num, move.total)
+
+    def report(self):
+        stats = self.stats
+        return f"{stats['playouts']} playouts ({stats['reused']} reused, "\
+                f"{stats['nodes']} new nodes) in {stats['seconds']:.2f}s, "\
+                f"{stats['per_second']:.0f} playouts/sec"
+
+
+def tournament(games, player_count, time_limit=.1, seed=None,
+                node_limit=None):
+    """
+    Play games with one MCTSPlayer against the usual computer players
+
+    The MCTSPlayer takes a different seat each game.
+
+    Arguments:
+        games (int) - number of games to play
+        player_count (int) - number of players in each game
+        time_limit (float) - seconds the MCTSPlayer takes for each move
+        seed (int) - random seed of the games (None picks one at random)
+        node_limit (int) - most playouts the MCTSPlayer takes for each move
+            (None for no limit)
+
+    returns a tuple of (wins, playouts per second)
+    """
+
+    rng = random.Random(seed)
+    searcher = MCTSPlayer(time_limit, node_limit, seed=rng.getrandbits(64))
+    wins = 0
+    playouts, seconds = 0, 0
+    for i in range(games):
+        my_game = perudo.Game(player_count, seed=rng.getrandbits(64))
+        seat = i % player_count
+        while my_game.players_left() > 1:
+            if my_game.current_player == seat:
+                searcher.make_move(my_game)
+                playouts += searcher.stats["playouts"]
+                seconds += searcher.stats["seconds"]
+            else:
+                my_game.make_safest_move()
+        if my_game.players[seat].cup != []:
+            wins += 1
+    return wins, playouts / max(seconds, 1e-9)
+
+
+if __name__ == "__main__":
+    games = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    player_count = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    time_limit = float(sys.argv[3]) if len(sys.argv) > 3 else .1
+    wins, per_second = tournament(games, player_count, time_limit)
+    print(f"MCTSPlayer won {wins} of {games} games against "\
+            f"{player_count - 1} computer players "\
+            f"({wins / games:.0%}, {1 / player_count:.0%} by chance), "\
+            f"at {per_second:.0f} playouts/sec")
@@ -2,8 +2,25 @@
 # Command-line program to give the probabilities for each possible move
 # for a given game state of Perudo.
 # See rules.txt for an English language explanation of the rules
+# To look the safest move up in a policy table (see policy_table.py), run
+# with Python 3: python move_probability.py --table table_file
+# To score many game states at once, run python move_probability.py --batch
+# with JSON lines (or --csv) on stdin or in a file (see batch)
 
+import argparse
+import csv
+import json
 import perudo
+import policy_table
+import sys
+from time import perf_counter
+
+# number of distinct states whose output batch remembers
+BATCH_CACHE_SIZE = 100000
+
+# the most dice in play that a batch state may have, as working out the
+# probabilities for a game takes longer the more dice are in play
+MAX_TOTAL_DICE = 10000
 
 def main():
     """
@@ -61,6 +78,8 @@ def main():
             continue
         if bet_exists == "n" or bet_exists == "N":
             bet = None
+            # the previous player's cup size only matters once there's a bet
+            previous_dice_count = None
             break
         else:
             # Get info about current bet
@@ -143,5 +162,269 @@ def main():
             print(f"Bet of Number {bet_prob[0].num} and",
                   f"Quantity {bet_prob[0].total}: {prob:.1f}%")
 
+    # the move a computer player would make, from the policy table if one
+    # was loaded and it has this state
+    safest = None
+    if perudo.policy_table != None:
+        safest = perudo.policy_table.lookup(total_dice_count,
+                            previous_dice_count, cup, bet, palifico)
+    if safest == None:
+        safest = perudo.best_move(total_dice_count, previous_dice_count,
+                            next_dice_count, cup, bet, palifico)
+    print(f"Safest move: {safest[0]} ({safest[1] * 100:.1f}%)")
+
+class StateError(Exception):
+    """Raised for a game state in batch input that doesn't make sense"""
+    pass
+
+
+def make_state(total_dice_count, cup, bet, previous_dice_count,
+                next_dice_count, palifico):
+    """
+    Check a game state from batch input
+
+    Arguments:
+        total_dice_count (int) - number of dice in play, including the cup
+        cup (list of ints) - the current player's dice
+        bet (tuple of ints) - (num, total) of the bet in play, or None
+        previous_dice_count (int) - previous player's cup size (only needed
+            when there is a bet)
+        next_dice_count (int) - next player's cup size (may be None)
+        palifico (bool) - True in a palifico round
+
+    returns a tuple of the arguments to perudo.get_all_bets, with bet as a
+        perudo.Bet object
+    """
+
+    if type(total_dice_count) != int or total_dice_count < 1 or  \
+            total_dice_count > MAX_TOTAL_DICE:
+        raise StateError("total_dice must be a whole number from 1 to "\
+                            f"{MAX_TOTAL_DICE}")
+    if type(cup) != list or len(cup) < 1 or  \
+            any(type(d) != int or d < 1 or d > perudo.DIE_SIDES for d in cup):
+        raise StateError("cup must hold 1 or more dice from 1 to "\
+                            f"{perudo.DIE_SIDES}")
+    if total_dice_count < len(cup):
+        raise StateError("total_dice must include the dice in cup")
+    if bet != None:
+        if len(bet) != 2 or type(bet[0]) != int or type(bet[1]) != int or  \
+                bet[0] < 1 or bet[0] > perudo.DIE_SIDES or bet[1] < 1 or  \
+                bet[1] > total_dice_count:
+            raise StateError(f"bet must be a number from 1 to "\
+                                f"{perudo.DIE_SIDES} and a quantity from 1 "\
+                                "to total_dice")
+        if type(previous_dice_count) != int or previous_dice_count < 1 or  \
+                previous_dice_count > total_dice_count - len(cup):
+            raise StateError("previous_dice is needed when there is a bet, "\
+                                "and must be a whole number from 1 to the "\
+                                "dice that aren't in cup")
+        bet = perudo.Bet(bet[0], bet[1])
+    if next_dice_count != None and (type(next_dice_count) != int or  \
+            next_dice_count < 1):
+        raise StateError("next_dice must be a positive whole number")
+    if type(palifico) != bool:
+        raise StateError("palifico must be true or false")
+    if next_dice_count == None:
+        next_dice_count = 1
+    return total_dice_count, previous_dice_count, next_dice_count, cup,  \
+            bet, palifico
+
+
+def score_state(state):
+    """
+    Get the move list of a game state from make_state
+
+    returns a list of tuples, ("Dudo", prob) for a dudo call and
+        (num, total, prob) for each bet, in the order of perudo.get_all_bets
+    """
+
+    moves = []
+    for move, prob in perudo.get_all_bets(*state):
+        if move == "Dudo":
+            moves.append(("Dudo", prob))
+        else:
+            moves.append((move.num, move.total, prob))
+    return moves
+
+
+def json_state(record):
+    """
+    Get a game state from a dict of JSON input (see read_json_states)
+
+    returns a tuple from make_state
+    """
+
+    return make_state(record["total_dice"], record["cup"], record.get("bet"),
+                        record.get("previous_dice"), record.get("next_dice"),
+                        record.get("palifico", False))
+
+
+def read_json_states(infile):
+    """
+    Read game states from JSON lines, one object per line, like:
+        {"total_dice": 20, "cup": [2, 2, 5], "bet": [4, 6],
+            "previous_dice": 4, "next_dice": 3, "palifico": false}
+    Only total_dice and cup are required, and "id" is passed through to
+    the output.
+
+    yields a tuple of (id, state) for each line, where state is from
+        make_state or a StateError
+    """
+
+    for line_number, line in enumerate(infile, 1):
+        if line.strip() == "":
+            continue
+        state_id = line_number
+        try:
+            record = json.loads(line)
+            state_id = record.get("id", line_number)
+            state = json_state(record)
+        except StateError as err:
+            state = StateError(f"line {line_number}: {err}")
+        except (ValueError, KeyError, TypeError, IndexError,
+                AttributeError) as err:
+            state = StateError(f"line {line_number}: {err!r}")
+        yield state_id, state
+
+
+def read_csv_states(infile):
+    """
+    Read game states from CSV with a header row of the columns
+        total_dice, cup, bet_num, bet_total, previous_dice, next_dice,
+        palifico, and optionally id
+    where cup is the dice separated by spaces (e.g. "2 2 5"), bet_num and
+    bet_total are empty when there is no bet, and palifico is 1 or 0.
+
+    yields a tuple of (id, state) for each row, like read_json_states
+    """
+
+    def number(value):
+        if value == None or value.strip() == "":
+            return None
+        return int(value)
+
+    for row_number, row in enumerate(csv.DictReader(infile), 1):
+        try:
+            bet = None
+            if number(row.get("bet_num")) != None:
+                bet = (number(row["bet_num"]), number(row["bet_total"]))
+            palifico = row.get("palifico", "0").strip().lower()  \
+                        in ["1", "true", "y"]
+            state = make_state(number(row["total_dice"]),
+                                [int(d) for d in row["cup"].split()], bet,
+                                number(row.get("previous_dice")),
+                                number(row.get("next_dice")), palifico)
+        except StateError as err:
+            state = StateError(f"row {row_number}: {err}")
+        except (ValueError, KeyError, TypeError, AttributeError) as err:
+            state = StateError(f"row {row_number}: {err!r}")
+        yield row.get("id") or row_number, state
+
+
+def batch(infile, outfile, use_csv=False):
+    """
+    Write the move list of every game state read from infile
+
+    Identical states (the same dice in any order) are only worked out once,
+    while they are among the last BATCH_CACHE_SIZE distinct states.
+
+    Arguments:
+        infile - file of game states (see read_json_states and
+            read_csv_states)
+        outfile - file to write the move lists to. For JSON input, one line
+            per state like {"id": 1, "moves": [["Dudo", 0.41],
+            [4, 7, 0.38], ...]}, with bets as [num, total, probability].
+            For CSV input, one row per move with the columns id, move, num,
+            total, probability.
+        use_csv (bool) - True if infile is CSV rather than JSON lines
+
+    returns a tuple of ints (states, errors, cache hits)
+    """
+
+    cache = perudo.StateCache(BATCH_CACHE_SIZE)
+    if use_csv:
+        states = read_csv_states(infile)
+        writer = csv.writer(outfile, lineterminator="\n")
+        writer.writerow(["id", "move", "num", "total", "probability"])
+    else:
+        states = read_json_states(infile)
+
+    count, errors = 0, 0
+    for state_id, state in states:
+        count += 1
+        if type(state) == StateError:
+            errors += 1
+            if use_csv:
+                writer.writerow([state_id, "error", "", "", str(state)])
+            else:
+                outfile.write(json.dumps({"id": state_id,
+                                            "error": str(state)}) + "\n")
+            continue
+
+        total_dice_count, previous_dice_count, next_dice_count, cup,  \
+            bet, palifico = state
+        key = perudo.state_key(total_dice_count, previous_dice_count, cup,
+                                bet, palifico)
+        moves = cache.get(key)
+        if moves == None:
+            # a state that can't be scored gets an error, like one that
+            # doesn't make sense, rather than stopping the batch
+            try:
+                moves = score_state(state)
+            except Exception as err:
+                errors += 1
+                if use_csv:
+                    writer.writerow([state_id, "error", "", "", repr(err)])
+                else:
+                    outfile.write(json.dumps({"id": state_id,
+                                                "error": repr(err)}) + "\n")
+                continue
+            if not use_csv:
+                # keep the JSON text, so a repeated state is just written
+                moves = json.dumps(moves)
+            cache.put(key, moves)
+
+        if use_csv:
+            for move in moves:
+                if move[0] == "Dudo":
+                    writer.writerow([state_id, "Dudo", "", "", move[1]])
+                else:
+                    writer.writerow([state_id, "Bet"] + list(move))
+        else:
+            outfile.write(f'{{"id": {json.dumps(state_id)}, '\
+                            f'"moves": {moves}}}\n')
+
+    return count, errors, cache.hits
+
+
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Give the probability of "\
+                    "success of each possible move on a turn of Perudo.")
+    parser.add_argument("--table", help="policy table file to look the "\
+                    "safest move up in (see policy_table.py)")
+    parser.add_argument("--batch", nargs="?", const="-", metavar="FILE",
+                    help="score every game state in FILE (default stdin) "\
+                    "instead of asking for one")
+    parser.add_argument("--csv", action="store_true",
+                    help="batch input is CSV rather than JSON lines")
+    parser.add_argument("--output", default="-",
+                    help="file to write batch results to (default stdout)")
+    args = parser.parse_args()
+
+    if args.table != None:
+        policy_table.load(args.table)
+
+    if args.batch == None:
+        main()
+    else:
+        infile = sys.stdin if args.batch == "-"  \
+                    else open(args.batch, newline="")
+        outfile = sys.stdout if args.output == "-"  \
+                    else open(args.output, "w", newline="")
+        start = perf_counter()
+        count, errors, hits = batch(infile, outfile, args.csv)
+        seconds = perf_counter() - start
+        outfile.flush()
+        print(f"{count} states ({errors} errors, {hits} repeats) in "\
+                f"{seconds:.2f}s, {count / max(seconds, 1e-9):.0f} states/sec",
+                file=sys.stderr)
@@ -0,0 +1,90 @@
+# Charles Dieterle
+# Runs Perudo simulations across a pool of worker processes
+# The trials are split into fixed-size chunks, and every chunk gets its own
+# random seed derived from one master seed. The chunks' results are merged in
+# chunk order, so a run gives the same results for any number of workers.
+
+import hashlib
+import random
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+
+# number of games simulated in each chunk of work
+CHUNK_SIZE = 100
+
+def chunk_seed(seed, index):
+    """
+    Derive the random seed for one chunk of trials from the master seed
+
+    Arguments:
+        seed (int) - the master seed of the run
+        index (int) - the chunk number
+
+    returns an int
+    """
+
+    digest = hashlib.sha256(f"{seed}:{index}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def add_aggregates(a, b):
+    """
+    Merge two partial aggregates by adding them together
+
+    Aggregates are numbers, or lists and tuples of aggregates (for example,
+    a tuple of sums and counts, or one list of sums per ratio bucket).
+
+    returns an aggregate of the same shape as a and b
+    """
+
+    if isinstance(a, (list, tuple)):
+        return type(a)(add_aggregates(x, y) for x, y in zip(a, b))
+    return a + b
+
+
+def _run_chunk(task):
+    """Seed the random module, then simulate one chunk of trials"""
+    worker, seed, trials, args = task
+    random.seed(seed)
+    return worker(trials, *args)
+
+
+def run_trials(worker, args, num_trials, workers=None, seed=None,
+                merge=add_aggregates):
+    """
+    Simulate num_trials games in chunks, possibly across several processes
+
+    Arguments:
+        worker (function) - a module-level function, called as
+            worker(trials, *args), that simulates that many games and
+            returns partial aggregates (sums and counts, not raw lists)
+        args (tuple) - the rest of the worker's arguments
+        num_trials (int) - total number of games to be simulated
+        workers (int) - number of worker processes. None (or 1) runs every
+            chunk in this process, leaving the state of its random module
+            as it was.
+        seed (int) - the master seed. If None, one is picked at random.
+        merge (function) - combines two partial aggregates into one
+
+    returns the merged aggregates of every chunk
+    """
+
+    if seed == None:
+        seed = random.randrange(2 ** 32)
+
+    tasks = []
+    for index, start in enumerate(range(0, num_trials, CHUNK_SIZE)):
+        trials = min(CHUNK_SIZE, num_trials - start)
+        tasks.append((worker, chunk_seed(seed, index), trials, args))
+
+    if workers == None or workers == 1:
+        # the chunks reseed the random module, so the caller's random state
+        # is put back once they are done
+        state = random.getstate()
+        try:
+            return reduce(merge, map(_run_chunk, tasks))
+        finally:
+            random.setstate(state)
+
+    with ProcessPoolExecutor(workers) as executor:
+        return reduce(merge, executor.map(_run_chunk, tasks))
@@ -3,7 +3,11 @@
 # See rules.txt for an English language explanation of the rules
 
 import random
-from math import factorial
+from array import array
+from collections import OrderedDict, namedtuple
+from math import exp, lgamma, log
+from operator import index
+from time import perf_counter_ns
 
 # global constants to declare how many sides per die and dice per player
 DIE_SIDES = 6
@@ -13,28 +17,172 @@ DICE_PER_PLAYER = 5
 # rate is close to their actual success rate
 # See probability.txt for a complete explanation.
 
+# number of die faces a DiceSource generates at a time
+DICE_BUFFER_SIZE = 1024
+
+# A precomputed table of safest moves (see policy_table.py) that
+# Game.make_safest_move looks up before working out a move, or None
+policy_table = None
+
+# An estimator (see inference.py) that Game.make_safest_move asks for a move
+# before the policy table, or None. Its best_move(game) returns a tuple of
+# form (move, prob) like best_move, or None to fall back on the usual
+# calculation.
+move_estimator = None
+
+# A table of solved heads-up rounds (see endgame.py) that
+# Game.make_safest_move draws its move from before anything else, or None.
+# Its best_move(game) returns a tuple of form (move, prob) like best_move,
+# or None for rounds that aren't in the table.
+endgame_table = None
+
+# bytes.translate tables for DiceSource: each byte's face, and the bytes at
+# or above the largest multiple of DIE_SIDES that fits in a byte
+_BYTE_FACES = bytes(b % DIE_SIDES + 1 if DIE_SIDES <= 255 else 0
+                    for b in range(256))
+_BYTE_WASTE = bytes(range(256 // DIE_SIDES * DIE_SIDES, 256))
+
+
+class DiceSource():
+    """
+    Rolls dice for a game, from a buffer of faces generated in bulk
+
+    The buffer is filled from random bytes, rather than one randint call
+    per die. Bytes at or above the largest multiple of DIE_SIDES that fits
+    in a byte are thrown away, so every face stays equally likely for any
+    number of sides (with DIE_SIDES = 6, 4 of every 256 bytes are wasted).
+
+    Attributes:
+        random - random.Random object that the faces are generated from
+        buffer - list of ints, the faces that haven't been rolled yet
+        position - int representing the next face in buffer to be rolled
+    """
+
+    def __init__(self, seed=None, buffer_size=DICE_BUFFER_SIZE):
+        self.random = random.Random(seed)
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.position = 0
+
+        # bytes per face, and the first value that is thrown away
+        self.width = 1
+        while 256 ** self.width < DIE_SIDES:
+            self.width += 1
+        self.limit = 256 ** self.width // DIE_SIDES * DIE_SIDES
+
+    def fill(self):
+        """Replace the used part of the buffer with new faces"""
+        data = self.random.randbytes(self.buffer_size * self.width)
+        if self.width == 1:
+            # drop the thrown away bytes and map the rest to faces in C
+            faces = list(data.translate(_BYTE_FACES, _BYTE_WASTE))
+        else:
+            limit = self.limit
+            faces = []
+            for i in range(0, len(data), self.width):
+                v = int.from_bytes(data[i:i + self.width], "little")
+                if v < limit:
+                    faces.append(v % DIE_SIDES + 1)
+        self.buffer = self.buffer[self.position:] + faces
+        self.position = 0
+
+    def roll(self, count):
+        """
+        Roll some dice
+
+        returns a list of count ints between 1 and DIE_SIDES
+        """
+
+        if self.position + count > len(self.buffer):
+            self.fill()
+            while count > len(self.buffer):
+                self.fill()
+        position = self.position
+        self.position = position + count
+        return self.buffer[position:position + count]
+
+    def randrange(self, n):
+        """returns a random int from 0 to n - 1"""
+        return self.random.randrange(n)
+
+
+class NumpyDiceSource(DiceSource):
+    """
+    A DiceSource that fills its buffer with a NumPy random Generator
+
+    Attributes:
+        generator - numpy.random.Generator object
+    """
+
+    def __init__(self, seed=None, buffer_size=DICE_BUFFER_SIZE):
+        import numpy as np
+        self.generator = np.random.default_rng(seed)
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.position = 0
+
+    def fill(self):
+        faces = self.generator.integers(1, DIE_SIDES + 1,
+                                        self.buffer_size).tolist()
+        self.buffer = self.buffer[self.position:] + faces
+        self.position = 0
+
+    def randrange(self, n):
+        return int(self.generator.integers(n))
+
+
 class Player():
     """
     A single player in a game of Perudo
 
     Attributes:
         cup - list of ints representing die rolls
+        face_counts - list of ints, where face_counts[num] is how many dice
+            in the cup show num (index 0 is unused)
+        table_counts - the game-wide face_counts list shared by every
+            player, or None for a player outside of a game
+        dice - the game's DiceSource object, or None to roll with the
+            random module
     """
 
     # players get a cup and 5 dice
-    def __init__(self):
-        self.cup = []
-        for i in range(DICE_PER_PLAYER):
-            self.cup.append(random.randint(1, DIE_SIDES))
+    def __init__(self, table_counts=None, dice=None):
+        self.face_counts = [0] * (DIE_SIDES + 1)
+        self.table_counts = table_counts
+        self.dice = dice
+        if dice != None:
+            self.cup = dice.roll(DICE_PER_PLAYER)
+        else:
+            self.cup = []
+            for i in range(DICE_PER_PLAYER):
+                self.cup.append(random.randint(1, DIE_SIDES))
+        self.count_dice(1)
+
+    # add (or with sign -1, remove) this cup's dice to the face counts
+    def count_dice(self, sign):
+        face_counts = self.face_counts
+        table_counts = self.table_counts
+        for d in self.cup:
+            face_counts[d] += sign
+            if table_counts != None:
+                table_counts[d] += sign
 
     # lose one die
     def lose_die(self):
-        self.cup.pop()
+        d = self.cup.pop()
+        self.face_counts[d] -= 1
+        if self.table_counts != None:
+            self.table_counts[d] -= 1
 
     # re-roll dice at the start of a new round
     def roll_dice(self):
-        for i in range(len(self.cup)):
-            self.cup[i] = random.randint(1, DIE_SIDES)
+        self.count_dice(-1)
+        if self.dice != None:
+            self.cup[:] = self.dice.roll(len(self.cup))
+        else:
+            for i in range(len(self.cup)):
+                self.cup[i] = random.randint(1, DIE_SIDES)
+        self.count_dice(1)
 
     def __str__(self):
         return str(self.cup)
@@ -44,20 +192,272 @@ class Bet():
     """
     A bet in a game of Perudo (a die number and a quantity of dice)
 
+    Bets can't be changed, and there is only one Bet object for each bet in
+    the table of bets (every number, for quantities up to BET_TABLE_TOTAL,
+    or up to the most any Game so far can need): Bet(num, total) looks it
+    up instead of making a new one, so making bets in the move generation
+    and game loops doesn't allocate anything. A bet outside of the table is
+    a new Bet object. Bets are equal (and hash the same) when their numbers
+    and quantities are, whether or not they are the same object.
+
+    Every bet has an ordinal (see bet_ordinal), its index in the table of
+    bets, which is also its index in the table of raises (see raise_row).
+
     Attributes:
         num - int representing the die number
         total - int representing the quantity of dice with number num
+        ordinal - int representing the bet's place in the table of bets, or
+                  None for a bet outside of the table
     """
 
-    # creates a bet in a round of Perudo
-    def __init__(self, num, total):
-        self.num = num
-        self.total = total
+    __slots__ = ["num", "total", "ordinal"]
+
+    # get the bet from the table, if it is in it
+    def __new__(cls, num, total):
+        try:
+            if 0 < num <= DIE_SIDES and total > 0:
+                return _bets[(total - 1) * DIE_SIDES + num - 1]
+        except (IndexError, TypeError):
+            pass
+        return _intern_bet(num, total)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Bet objects can't be changed.")
+
+    def __delattr__(self, name):
+        raise AttributeError("Bet objects can't be changed.")
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if type(other) != Bet:
+            return NotImplemented
+        return self.num == other.num and self.total == other.total
+
+    def __hash__(self):
+        return hash((self.num, self.total))
+
+    # copies and pickles of a bet in the table come back as the same object
+    def __reduce__(self):
+        return Bet, (self.num, self.total)
 
     def __str__(self):
         return f"Bet of Number: {self.num} and Quantity: {self.total}"
 
 
+def bet_ordinal(num, total):
+    """
+    Number a bet by its quantity, then its number
+
+    The bets on each number are DIE_SIDES ordinals apart, so the bets on
+    one number from one quantity to another are a slice with that step.
+    Adding bets with larger quantities to the end of the table never changes
+    the ordinals of the bets already in it.
+
+    returns an int, from 0 for the bet on 1 for 1 die
+    """
+
+    return (total - 1) * DIE_SIDES + num - 1
+
+
+# a quantity larger than any number of dice in play, for the numbers that
+# can't be bet on after a bet (see raise_row)
+NO_RAISE = 2 ** 62
+
+def _raise_row(num, total, palifico):
+    """
+    Work out the smallest legal quantity of each number after a bet
+
+    These are the rules that check_bet enforces, as quantities: a bet can
+    raise the quantity of its number, change to 1s with at least half the
+    quantity (rounding up), change from 1s with more than double the
+    quantity, or raise the number (with any quantity). In palifico rounds,
+    only the quantity can be raised.
+
+    returns a tuple of ints, where element [n] is the smallest quantity that
+        a bet on n can have after a bet on num for total dice (NO_RAISE if
+        it can't be bet on), and element 0 is unused
+    """
+
+    row = [NO_RAISE] * (DIE_SIDES + 1)
+    row[num] = total + 1
+    if not palifico:
+        if num == 1:
+            for n in range(2, DIE_SIDES + 1):
+                row[n] = total * 2 + 1
+        else:
+            row[1] = (total + 1) // 2
+            for n in range(num + 1, DIE_SIDES + 1):
+                row[n] = 1
+    return tuple(row)
+
+
+# every Bet object, where _bets[bet_ordinal(num, total)] is the bet on num
+# for total dice, and the row from _raise_row for each of them, without and
+# with palifico rules
+_bets = []
+_raise_rows = ([], [])
+
+# the row from _raise_row for the opening bet of a round: any number, for
+# any quantity
+_OPENING_ROW = (NO_RAISE,) + (1,) * DIE_SIDES
+
+# a row that no bet passes, for check_bet after a bet outside of the table
+_UNLISTED_ROW = (NO_RAISE,) * (DIE_SIDES + 1)
+
+# quantity that the bet table is built up to when perudo is imported
+BET_TABLE_TOTAL = 64
+
+
+def _new_bet(num, total, ordinal):
+    bet = object.__new__(Bet)
+    object.__setattr__(bet, "num", num)
+    object.__setattr__(bet, "total", total)
+    object.__setattr__(bet, "ordinal", ordinal)
+    return bet
+
+
+def intern_bets(max_total):
+    """Make the Bet objects (and their raise rows) of every number for
+        quantities up to max_total"""
+    for ordinal in range(len(_bets), max_total * DIE_SIDES):
+        total, num = divmod(ordinal, DIE_SIDES)
+        num, total = num + 1, total + 1
+        _bets.append(_new_bet(num, total, ordinal))
+        _raise_rows[False].append(_raise_row(num, total, False))
+        _raise_rows[True].append(_raise_row(num, total, True))
+
+
+def _intern_bet(num, total):
+    """
+    returns the Bet object of a bet that isn't in the table of bets
+
+    The table only grows when a Game (or legal_bets) asks for it, so a bet
+    with a larger quantity gets a new Bet object outside of the table,
+    rather than the table growing to whatever quantity is asked for. So
+    does a bet with a number or quantity that no legal bet has, and those
+    aren't kept either, so asking for many of them doesn't use up memory.
+    """
+
+    if type(num) != int or type(total) != int:
+        try:
+            num, total = index(num), index(total)
+        except TypeError:
+            pass
+    if type(num) == int and type(total) == int and 1 <= num <= DIE_SIDES  \
+            and total >= 1:
+        if total <= len(_bets) // DIE_SIDES:
+            return _bets[bet_ordinal(num, total)]
+    return _new_bet(num, total, None)
+
+
+intern_bets(BET_TABLE_TOTAL)
+
+
+def raise_row(bet_state, palifico=False):
+    """
+    Look up the smallest legal quantity of each number after a bet
+
+    Arguments:
+        bet_state (Bet object) : the current bet state, or None
+        palifico (Bool) : set to True when palifico rules are in play
+
+    returns a tuple of ints (see _raise_row)
+    """
+
+    if bet_state == None:
+        return _OPENING_ROW
+    if bet_state.ordinal == None:
+        return _raise_row(bet_state.num, bet_state.total, palifico)
+    return _raise_rows[palifico][bet_state.ordinal]
+
+
+def legal_bets(dice_count, bet_state=None, palifico=False):
+    """
+    List every legal bet
+
+    Arguments:
+        dice_count (int) : the total number of dice in play
+        bet_state (Bet object) : the current bet state, or None
+        palifico (Bool) : set to True when palifico rules are in play
+
+    returns a list of Bet objects, by number and then by quantity
+    """
+
+    intern_bets(dice_count)
+    row = raise_row(bet_state, palifico)
+    bets = []
+    for num in range(1, DIE_SIDES + 1):
+        if row[num] <= dice_count:
+            bets += _bets[bet_ordinal(num, row[num]):  \
+                            bet_ordinal(num, dice_count) + 1:DIE_SIDES]
+    return bets
+
+
+class DudoOutcome():
+    """
+    The result of a dudo call
+
+    Attributes:
+        caller - int representing the player who called dudo
+        defender - int representing the player who made the bet
+        bet - Bet object representing the bet that was challenged
+        actual_total - int representing how many dice counted toward the bet
+        probability - float representing the caller's calculated probability
+                      of the call succeeding, or None if it wasn't worked out
+                      (e.g. a human called dudo)
+        loser - int representing the player who lost a die
+        eliminated - bool representing whether the loser lost their last die
+        caller_dice - int representing the caller's cup size at the call
+        defender_dice - int representing the defender's cup size at the call
+        dice_count - int representing how many dice were in play at the call
+    """
+
+    __slots__ = ("caller", "defender", "bet", "actual_total", "probability",
+                    "loser", "eliminated", "caller_dice", "defender_dice",
+                    "dice_count")
+
+    def __init__(self, caller, defender, bet, actual_total, probability,
+                    loser, eliminated, caller_dice, defender_dice, dice_count):
+        self.caller = caller
+        self.defender = defender
+        self.bet = bet
+        self.actual_total = actual_total
+        self.probability = probability
+        self.loser = loser
+        self.eliminated = eliminated
+        self.caller_dice = caller_dice
+        self.defender_dice = defender_dice
+        self.dice_count = dice_count
+
+    # the call succeeds when the bet was wrong, so the defender loses a die
+    @property
+    def successful(self):
+        return self.loser == self.defender
+
+    def __str__(self):
+        if self.successful:
+            result = "won"
+        else:
+            result = "lost"
+        return f"Player {self.caller + 1} called dudo on player "\
+                f"{self.defender + 1} and {result} ({self.actual_total} "\
+                f"dice counted toward the bet)"
+
+
+# An immutable snapshot of a game (see Game.snapshot and apply_move), made
+# only of tuples and ints so that it is cheap to copy, compare and hash:
+#   cups - tuple of each player's cup, as a tuple of ints (empty once the
+#          player is out)
+#   bet - (num, total) of the bet in play, or None
+#   player - int representing the player whose turn it is
+#   round - int representing which round of the game it is
+#   palifico - bool representing whether palifico rules are in play
+#   bets - tuple of (player, num, total) for the bets made this round
+GameState = namedtuple("GameState",
+                        ["cups", "bet", "player", "round", "palifico", "bets"])
+
+
 class Game():
     """
     A game of Perudo
@@ -71,228 +471,268 @@ class Game():
         move_list - list of (Bet object, probability) pairs
                     where probability is a float
         palifico - bool representing whether palifico rules are in play or not
+        face_counts - list of ints, where face_counts[num] is how many dice
+                      in play show num (index 0 is unused)
+        live_players - int representing how many players still have dice
+        next_seat - list of ints, where next_seat[i] is the first player
+                    after player i who still has dice
+        previous_seat - list of ints, the same as next_seat for the first
+                        player before player i
+        observer - function called with the DudoOutcome of every dudo call,
+                   or None
+        dice - DiceSource object that the players roll their dice from. A
+               seed can be passed instead, to make the game repeatable.
+        bets - list of (player, Bet object) pairs, the bets made so far in
+               this round, in order
     """
 
     # start the game with player_count players
-    def __init__(self, player_count):
+    def __init__(self, player_count, observer=None, seed=None, dice=None):
+        # without a seed, the dice are seeded from the random module, so
+        # random.seed still makes a whole simulation repeatable
+        if dice == None:
+            if seed == None:
+                seed = random.getrandbits(64)
+            dice = DiceSource(seed)
+        self.dice = dice
+        self.face_counts = [0] * (DIE_SIDES + 1)
         self.players = []
         for i in range(player_count):
-            self.players.append(Player())
+            self.players.append(Player(self.face_counts, dice))
         self.current_bet = None
-        self.current_player = random.randint(0, player_count - 1)
+        self.bets = []
+        self.current_player = dice.randrange(player_count)
         self.round = 1
         self.max_player_count = player_count
+        self.live_players = player_count
+        self.next_seat = [(i + 1) % player_count for i in range(player_count)]
+        self.previous_seat = [(i - 1) % player_count
+                                for i in range(player_count)]
         self.dice_count = player_count * DICE_PER_PLAYER
-        self.move_list = get_all_bets(self.dice_count,  \
-                                        len(self.get_previous_player().cup),  \
-                                        len(self.get_next_player().cup),  \
-                                        self.get_current_player().cup,  \
-                                        None)
+        build_tail_table(self.dice_count)
+        # a bet after a bet on 1s can go up to twice the quantity, plus 1
+        intern_bets(2 * self.dice_count + 1)
+        self._move_list = None
         self.palifico = False
+        self.observer = observer
+
+    # The move list is only worked out when something asks for it (a human's
+    # turn never needs it), and is thrown away whenever a bet or a new round
+    # changes the game state.
+    @property
+    def move_list(self):
+        if self._move_list == None:
+            current = self.get_current_player()
+            self._move_list = get_all_bets(self.dice_count,  \
+                                    len(self.get_previous_player().cup),  \
+                                    len(self.get_next_player().cup),  \
+                                    current.cup, self.current_bet,  \
+                                    palifico=self.palifico,  \
+                                    face_counts=current.face_counts)
+        return self._move_list
+
+    def snapshot(self):
+        """
+        Save the state of the game
+
+        returns a GameState, which restore can go back to. The players'
+            DiceSource and observer are not part of it.
+        """
+
+        bet = None
+        if self.current_bet != None:
+            bet = (self.current_bet.num, self.current_bet.total)
+        return GameState(tuple([tuple(p.cup) for p in self.players]), bet,
+                            self.current_player, self.round, self.palifico,
+                            tuple([(seat, b.num, b.total)
+                                    for seat, b in self.bets]))
+
+    def restore(self, state):
+        """
+        Go back to a state from snapshot (or apply_move)
+
+        The state must have as many players as the game.
+        """
+
+        if len(state.cups) != len(self.players):
+            raise MoveError(f"The state is for {len(state.cups)} players, "\
+                            f"not {len(self.players)}.")
+        for p, cup in zip(self.players, state.cups):
+            p.count_dice(-1)
+            p.cup[:] = cup
+            p.count_dice(1)
+
+        self.current_bet = None
+        if state.bet != None:
+            self.current_bet = Bet(state.bet[0], state.bet[1])
+        self.bets = [(seat, Bet(num, total)) for seat, num, total in state.bets]
+        self.current_player = state.player
+        self.round = state.round
+        self.palifico = state.palifico
+        self.dice_count = sum([len(cup) for cup in state.cups])
+        self._move_list = None
+
+        # link every seat to the nearest seats that still have dice
+        self.live_players = 0
+        for seat in range(len(self.players)):
+            self.next_seat[seat] = next_seat(state.cups, seat)
+            self.previous_seat[seat] = previous_seat(state.cups, seat)
+            if state.cups[seat] != ():
+                self.live_players += 1
 
     # syntactic sugar for getting the current Player object
     def get_current_player(self):
         return self.players[self.current_player]
 
     def get_previous_player(self):
-        player_num = self.current_player - 1
-        while True:
-            if player_num < 0:
-                player_num = self.max_player_count - 1
-                continue
-            if self.players[player_num].cup == []:
-                player_num -= 1
-                continue
-            break
-        return self.players[player_num]
+        return self.players[self.previous_seat[self.current_player]]
 
     def get_next_player(self):
-        player_num = self.current_player + 1
-        while True:
-            if player_num > self.max_player_count - 1:
-                player_num = 0
-                continue
-            if self.players[player_num].cup == []:
-                player_num += 1
-                continue
-            break
-        return self.players[player_num]
+        return self.players[self.next_seat[self.current_player]]
 
     # make a bet
     def make_bet(self, num, total):
-        # check for non-sensical bets
-        if num < 1 or num > DIE_SIDES:
-            raise BetError("ILLEGAL BET: Die number must be between "\
-                            f"1 and {DIE_SIDES}.")
-        if total > self.dice_count:
-            raise BetError("ILLEGAL BET: Dice quantity cannot be greater "\
-                            "than the total number of dice in play.")
-        if self.current_bet:
-            if self.palifico and num != self.current_bet.num:
-                raise BetError("ILLEGAL BET: Cannot change the die number "\
-                                "of a bet in a palifico round.")
-
-        # make sure the bet is valid in the current bet environment
-        if self.current_bet != None:
-            current_num = self.current_bet.num
-            current_total = self.current_bet.total
-            if current_num == 1:
-                if num == 1 and total <= current_total:
-                    raise BetError("ILLEGAL BET: Must raise either the "\
-                                    "bet quantity or the die number.")
-                if num > 1 and total <= current_total * 2:
-                    raise BetError("ILLEGAL BET: If increasing the die value "\
-                                    "from 1, the dice quantity must be "\
-                                    f"at least {current_total * 2 + 1}.")
-            else:
-                if num == 1:
-                    if current_total % 2 == 1:
-                        ones_total = int(current_total / 2) + 1
-                    else:
-                        ones_total = int(current_total / 2)
-                    if total < ones_total:
-                        raise BetError("ILLEGAL BET: If decreasing the die "\
-                                        "value to 1, the bet quantity "\
-                                        f"must be at least {ones_total}.")
-                else:
-                    if num < current_num:
-                        raise BetError("ILLEGAL BET: Cannot bet on a die "\
-                                        "number less than the current bet, "\
-                                        "except for 1.")
-                    elif total <= current_total and num == current_num:
-                        raise BetError("ILLEGAL BET: Must raise either the "\
-                                        "bet quantity or the die number.")
+        check_bet(num, total, self.dice_count, self.current_bet, self.palifico)
 
         # bet is legal, so change the current_bet for the game
         self.current_bet = Bet(num, total)
+        self.bets.append((self.current_player, self.current_bet))
         self.set_next_player()
-        if self.palifico:
-            self.move_list = get_all_bets(self.dice_count,  \
-                                            len(self.get_previous_player().cup),  \
-                                            len(self.get_next_player().cup),  \
-                                            self.get_current_player().cup,  \
-                                            self.current_bet, palifico=True)
-        else:
-            self.move_list = get_all_bets(self.dice_count,  \
-                                            len(self.get_previous_player().cup),  \
-                                            len(self.get_next_player().cup),  \
-                                            self.get_current_player().cup,  \
-                                            self.current_bet)
+        self._move_list = None
 
     # start a new round
     def start_new_round(self):
         for p in self.players:
             p.roll_dice()
         self.current_bet = None
+        self.bets = []
         self.round += 1
-        if self.palifico:
-            self.move_list = get_all_bets(self.dice_count, len(self.get_previous_player().cup), len(self.get_next_player().cup), self.get_current_player().cup, None, palifico=True)
-        else:
-            self.move_list = get_all_bets(self.dice_count,  \
-                                            len(self.get_previous_player().cup),  \
-                                            len(self.get_next_player().cup),
-                                            self.get_current_player().cup,
-                                            None)
+        self._move_list = None
 
     # set the current_player attribute to the next player
     def set_next_player(self):
-        if self.current_player == len(self.players) - 1:
-            self.current_player = 0
-        else:
-            self.current_player += 1
-        # if current_player is out of the game, go to the next player
-        if self.get_current_player().cup == []:
-            self.set_next_player()
+        self.current_player = self.next_seat[self.current_player]
 
     # set the current_player attribute to the previous player
     def set_previous_player(self):
-        if self.current_player == 0:
-            self.current_player = len(self.players) - 1
-        else:
-            self.current_player -= 1
-        # if current_player is out of the game, go to the previous player
-        if self.get_current_player().cup == []:
-            self.set_previous_player()
+        self.current_player = self.previous_seat[self.current_player]
 
     # returns the number of active players
     def players_left(self):
-        count = 0
-        for player in self.players:
-            if player.cup != []:
-                count += 1
-        return count
+        return self.live_players
+
+    # take an eliminated player's seat out of the ring of active seats.
+    # The seat keeps its own links, so the players after and before it can
+    # still be found from it.
+    def remove_seat(self, seat):
+        next_seat = self.next_seat[seat]
+        previous_seat = self.previous_seat[seat]
+        self.next_seat[previous_seat] = next_seat
+        self.previous_seat[next_seat] = previous_seat
+        self.live_players -= 1
 
     # call dudo, ending the round, or potentially ending the game
-    def dudo(self):
+    def dudo(self, probability=None):
+        """
+        Call dudo on the current bet, and take a die from the loser
+
+        Arguments:
+            probability (float) : the caller's calculated probability of
+                the call succeeding, if it was worked out
+
+        returns a DudoOutcome object, which is also passed to the observer
+        """
+
         if self.current_bet == None:
             raise MoveError("Cannot call dudo until a player has bet.")
 
         # get the current bet, compare it to the actual dice totals
-        die_number = self.current_bet.num
-        guess_total = self.current_bet.total
-        actual_total = 0
-        for p in self.players:
-            for die in p.cup:
-                # if palifico round, 1s aren't wildcard
-                if self.palifico:
-                    if die == die_number:
-                        actual_total += 1
-                else:
-                    if die == die_number or die == 1:
-                        actual_total += 1
+        bet = self.current_bet
+        die_number = bet.num
+        guess_total = bet.total
+        actual_total = self.face_counts[die_number]
+        # if palifico round, 1s aren't wildcard
+        if not self.palifico and die_number != 1:
+            actual_total += self.face_counts[1]
 
         # set palifico to False in case a palifico round just ended
         self.palifico = False
 
+        caller = self.current_player
+        defender = self.previous_seat[caller]
+        caller_dice = len(self.players[caller].cup)
+        defender_dice = len(self.players[defender].cup)
+
         # make previous player the current player if the bet was incorrect
         if guess_total > actual_total:
             self.set_previous_player()
 
-        losers_cup = self.get_current_player().cup
+        loser = self.get_current_player()
+        losers_cup = loser.cup
 
         # remove one die from the player who lost the bet
-        losers_cup.pop()
+        loser.lose_die()
         self.dice_count -= 1
 
+        outcome = DudoOutcome(caller, defender, bet, actual_total,
+                                probability, self.current_player,
+                                losers_cup == [], caller_dice, defender_dice,
+                                self.dice_count + 1)
+
         # set game to palifico mode if the losing player has just one die left
-        if len(losers_cup) == 1:
-            players_remaining = 0
-            for p in self.players:
-                if len(p.cup) > 0:
-                    players_remaining += 1
-            # palifico rounds only occur when more than 2 players remain
-            if players_remaining > 2:
-                self.palifico = True
+        # palifico rounds only occur when more than 2 players remain
+        if len(losers_cup) == 1 and self.live_players > 2:
+            self.palifico = True
 
         # if the losing player was eliminated, go to the next player
         if losers_cup == []:
+            self.remove_seat(self.current_player)
             self.set_next_player()
 
-            # if only one player left, end the game
-            if len(self.get_current_player().cup) == self.dice_count:
-                self.current_bet = None
-                return
+        # if only one player left, end the game
+        if self.live_players == 1:
+            self.current_bet = None
+            self.bets = []
+            self._move_list = None
+        else:
+            self.start_new_round()
 
-        self.start_new_round()
+        if self.observer != None:
+            self.observer(outcome)
+        return outcome
 
     # make the move with the highest probability of success
     def make_safest_move(self):
-        highest_prob = 0
-        best_move = None
-        for move in self.move_list:
-            if move[1] >= highest_prob:
-                highest_prob = move[1]
-                best_move = move[0]
-
-        if best_move == "Dudo":
-            self.dudo()
-
-            # The following line is included for the simulation file to gather
-            # data about forecasted dudo success vs. actual dudo success
-            return highest_prob
+        current = self.get_current_player()
+        previous_dice_count = len(self.get_previous_player().cup)
+
+        # states outside of the policy table are worked out as usual
+        result = None
+        if endgame_table != None and self.live_players == 2:
+            result = endgame_table.best_move(self)
+        if result == None and move_estimator != None:
+            result = move_estimator.best_move(self)
+        if result == None and policy_table != None:
+            result = policy_table.lookup(self.dice_count,  \
+                                    previous_dice_count, current.cup,  \
+                                    self.current_bet, self.palifico,  \
+                                    current.face_counts)
+        if result == None:
+            result = best_move(self.dice_count, previous_dice_count,  \
+                                    len(self.get_next_player().cup),  \
+                                    current.cup, self.current_bet,  \
+                                    palifico=self.palifico,  \
+                                    face_counts=current.face_counts)
+        safest, highest_prob = result
+
+        # on a dudo call, the outcome (including the calculated probability
+        # of success) is returned for the simulation files to gather data
+        # about forecasted dudo success vs. actual dudo success
+        if safest == "Dudo":
+            return self.dudo(highest_prob)
 
         else:
-            self.make_bet(best_move.num, best_move.total)
+            self.make_bet(safest.num, safest.total)
 
     def print_all_moves(self):
         """
@@ -316,6 +756,171 @@ class Game():
             print(f"{bet_prob[0]}: {prob:.1f}%")
 
 
+def check_bet(num, total, dice_count, current=None, palifico=False):
+    """
+    Make sure a bet can be made
+
+    A legal bet is found with one look in the table of raises (see
+    raise_row). The rules are only gone through one by one for the bets
+    that the table doesn't allow (to find the reason), and after bets that
+    aren't in the table of bets.
+
+    Arguments:
+        num (int) : the die number of the bet
+        total (int) : the quantity of the bet
+        dice_count (int) : the total number of dice in play
+        current (Bet object or tuple of ints) : the bet in play, or its
+            (num, total), or None
+        palifico (Bool) : set to True when palifico rules are in play
+
+    Raises a BetError if the bet is illegal
+    """
+
+    row = _OPENING_ROW
+    if current != None:
+        if type(current) == tuple:
+            current = Bet(current[0], current[1])
+        row = _UNLISTED_ROW
+        if current.ordinal != None:
+            row = _raise_rows[palifico][current.ordinal]
+    if 0 < num <= DIE_SIDES and row[num] <= total <= dice_count:
+        return
+
+    # check for non-sensical bets
+    if num < 1 or num > DIE_SIDES:
+        raise BetError("ILLEGAL BET: Die number must be between "\
+                        f"1 and {DIE_SIDES}.")
+    if total > dice_count:
+        raise BetError("ILLEGAL BET: Dice quantity cannot be greater "\
+                        "than the total number of dice in play.")
+    if current != None:
+        if palifico and num != current.num:
+            raise BetError("ILLEGAL BET: Cannot change the die number "\
+                            "of a bet in a palifico round.")
+
+    # make sure the bet is valid in the current bet environment
+    if current != None:
+        current_num, current_total = current.num, current.total
+        if current_num == 1:
+            if num == 1 and total <= current_total:
+                raise BetError("ILLEGAL BET: Must raise either the "\
+                                "bet quantity or the die number.")
+            if num > 1 and total <= current_total * 2:
+                raise BetError("ILLEGAL BET: If increasing the die value "\
+                                "from 1, the dice quantity must be "\
+                                f"at least {current_total * 2 + 1}.")
+        else:
+            if num == 1:
+                if current_total % 2 == 1:
+                    ones_total = int(current_total / 2) + 1
+                else:
+                    ones_total = int(current_total / 2)
+                if total < ones_total:
+                    raise BetError("ILLEGAL BET: If decreasing the die "\
+                                    "value to 1, the bet quantity "\
+                                    f"must be at least {ones_total}.")
+            else:
+                if num < current_num:
+                    raise BetError("ILLEGAL BET: Cannot bet on a die "\
+                                    "number less than the current bet, "\
+                                    "except for 1.")
+                elif total <= current_total and num == current_num:
+                    raise BetError("ILLEGAL BET: Must raise either the "\
+                                    "bet quantity or the die number.")
+
+
+def next_seat(cups, seat):
+    """returns the first player after seat with dice in cups (a GameState's)"""
+    seat = (seat + 1) % len(cups)
+    while cups[seat] == ():
+        seat = (seat + 1) % len(cups)
+    return seat
+
+
+def previous_seat(cups, seat):
+    """returns the first player before seat with dice in cups"""
+    seat = (seat - 1) % len(cups)
+    while cups[seat] == ():
+        seat = (seat - 1) % len(cups)
+    return seat
+
+
+# the DiceSource that apply_move rolls new rounds from if it isn't given one
+_apply_dice = None
+
+
+def apply_move(state, move, dice=None):
+    """
+    Make a move in a saved game state, without changing the state
+
+    Follows the same rules as Game.make_bet and Game.dudo: a dudo call takes
+    a die from the loser and starts a new round (unless the game is over),
+    with the loser (or the player after them, if they are out) to start.
+
+    Arguments:
+        state (GameState) : the state to move from
+        move : "Dudo", or a bet as a Bet object or a (num, total) tuple
+        dice (DiceSource) : where the new round's dice are rolled from. The
+            cups are rolled in player order, like Game.start_new_round, so
+            a copy of a game's DiceSource gives the same dice as the game.
+
+    returns a new GameState
+    """
+
+    global _apply_dice
+    cups, bet, player, round_number, palifico, bets = state
+    if move != "Dudo":
+        if type(move) == tuple:
+            num, total = move
+        else:
+            num, total = move.num, move.total
+        dice_count = 0
+        for cup in cups:
+            dice_count += len(cup)
+        check_bet(num, total, dice_count, bet, palifico)
+        return GameState(cups, (num, total), next_seat(cups, player),
+                            round_number, palifico,
+                            bets + ((player, num, total),))
+
+    if bet == None:
+        raise MoveError("Cannot call dudo until a player has bet.")
+
+    # compare the bet with the actual dice totals (in a palifico round, or
+    # on a bet on 1s, 1s aren't wild)
+    num, total = bet
+    actual_total = 0
+    for cup in cups:
+        actual_total += cup.count(num)
+        if num != 1 and not palifico:
+            actual_total += cup.count(1)
+
+    loser = player
+    if total > actual_total:
+        loser = previous_seat(cups, player)
+    cups = list(cups)
+    cups[loser] = cups[loser][:-1]
+    live_players = len(cups) - cups.count(())
+
+    # palifico rounds only occur when more than 2 players remain
+    palifico = len(cups[loser]) == 1 and live_players > 2
+    if live_players == 1:
+        return GameState(tuple(cups), None, next_seat(cups, loser),
+                            round_number, False, ())
+
+    if dice == None:
+        if _apply_dice == None:
+            _apply_dice = DiceSource(random.getrandbits(64))
+        dice = _apply_dice
+    for seat in range(len(cups)):
+        cups[seat] = tuple(dice.roll(len(cups[seat])))
+    if cups[loser] == ():
+        player = next_seat(cups, loser)
+    else:
+        player = loser
+    return GameState(tuple(cups), None, player, round_number + 1, palifico,
+                        ())
+
+
 def get_probability(dice_count, player_cup, a_bet, palifico=False):
     """
     Calculate the probability of a single bet succeeding
@@ -341,24 +946,150 @@ def get_probability(dice_count, player_cup, a_bet, palifico=False):
         if d == die_num or d == 1:
             hand_total += 1
 
-    # get values n, r, and p for the formula (see probability.txt for details)
+    # get values n and r for the formula (see probability.txt for details)
     n = dice_count - len(player_cup)
     r = a_bet.total - hand_total
-    # if r < 0, then the bet will always succeed
+
+    return tail_probability(n, r, die_num != 1 and not palifico)
+
+
+# Binomial tail probabilities, stored as _tail_tables[DIE_SIDES][wild][n][r].
+# The wild index is 0 when each unknown die matches the bet with probability
+# 1 / DIE_SIDES (bets on 1s, or any bet in a palifico round) and 1 when it
+# matches with probability 2 / DIE_SIDES (the bet number plus wild 1s).
+# Rows are added the first time a larger n is needed, so each DIE_SIDES
+# configuration only ever computes each row once.
+_tail_tables = {}
+
+# Rows for up to TAIL_TABLE_MAX_DICE unknown dice stay in the table for good.
+# Bigger tables would need too much memory to keep every row, so rows past
+# that size are kept in a small cache of the most recently used ones instead
+# (a game only ever looks at a handful of n values in any one round).
+TAIL_TABLE_MAX_DICE = 300
+TAIL_ROW_CACHE_SIZE = 64
+_large_tail_rows = OrderedDict()
+
+
+def _tail_row(n, p):
+    """
+    Calculate the chance that at least r of n dice match, for every r
+
+    The binomial terms are worked out in log space with lgamma, so they never
+    overflow the way factorial(n) does past 170 dice, and the tail is summed
+    from r = n downward so the tiny terms are added before the big ones.
+
+    Arguments:
+        n (int) : the number of unknown dice
+        p (float) : the chance of any single die matching the bet
+
+    returns an array of floats, indexed by r from 0 to n
+    """
+
+    row = array("d", bytes(8 * (n + 1)))
+    row[0] = 1.000
+    if p >= 1:
+        for r in range(1, n + 1):
+            row[r] = 1.000
+        return row
+
+    log_p = log(p)
+    log_q = log(1 - p)
+    log_n_fact = lgamma(n + 1)
+
+    total_prob = 0
+    for k in range(n, 0, -1):
+        total_prob += exp(log_n_fact - lgamma(k + 1) - lgamma(n - k + 1)
+                            + k * log_p + (n - k) * log_q)
+        # rounding can push the sum a hair over 1
+        row[k] = min(total_prob, 1.000)
+
+    return row
+
+
+def build_tail_table(dice_count):
+    """
+    Make sure the tail table covers every bet in a game of dice_count dice
+
+    Tables are only filled up to TAIL_TABLE_MAX_DICE rows; bigger games get
+    their rows from the recently used row cache instead.
+
+    Arguments:
+        dice_count (int) : the largest number of unknown dice to be looked up
+
+    returns the pair of row lists for the current DIE_SIDES
+    """
+
+    table = _tail_tables.get(DIE_SIDES)
+    if table is None:
+        table = ([], [])
+        _tail_tables[DIE_SIDES] = table
+
+    dice_count = min(dice_count, TAIL_TABLE_MAX_DICE)
+    for wild, rows in enumerate(table):
+        p = (wild + 1) / DIE_SIDES
+        while len(rows) <= dice_count:
+            rows.append(_tail_row(len(rows), p))
+
+    return table
+
+
+def tail_probability(n, r, wild=True):
+    """
+    Look up the probability that at least r of n unknown dice match a bet
+
+    Arguments:
+        n (int) : the number of dice the player can't see
+        r (int) : how many of those dice must match for the bet to succeed
+        wild (bool) : True if 1s count toward the bet (p = 2 / DIE_SIDES),
+            False for bets on 1s and palifico rounds (p = 1 / DIE_SIDES)
+
+    returns a float
+    """
+
+    # if r < 1, then the bet will always succeed
     if r < 1:
         return 1.000
-    if die_num == 1 or palifico:
-        p = 1 / DIE_SIDES
+    if r > n:
+        return 0
+
+    if n <= TAIL_TABLE_MAX_DICE:
+        table = _tail_tables.get(DIE_SIDES)
+        if table is None or len(table[0]) <= n:
+            table = build_tail_table(n)
+        return table[wild][n][r]
+
+    key = (DIE_SIDES, wild, n)
+    row = _large_tail_rows.get(key)
+    if row is None:
+        row = _tail_row(n, (wild + 1) / DIE_SIDES)
+        _large_tail_rows[key] = row
+        if len(_large_tail_rows) > TAIL_ROW_CACHE_SIZE:
+            _large_tail_rows.popitem(last=False)
     else:
-        p = 2 / DIE_SIDES
+        _large_tail_rows.move_to_end(key)
+    return row[r]
 
-    total_prob = 0
-    while r <= n:
-        nCr = factorial(n) / (factorial(r) * factorial(n - r))
-        total_prob += nCr * (p ** r) * ((1 - p) ** (n - r))
-        r += 1
 
-    return total_prob
+def tail_row(n, wild=True):
+    """
+    Get the whole row of tail probabilities for n unknown dice
+
+    Arguments:
+        n (int) : the number of dice the player can't see
+        wild (bool) : see tail_probability
+
+    returns an array of floats, where element r is tail_probability(n, r)
+    """
+
+    if n <= TAIL_TABLE_MAX_DICE:
+        table = _tail_tables.get(DIE_SIDES)
+        if table is None or len(table[0]) <= n:
+            table = build_tail_table(n)
+        return table[wild][n]
+
+    # make sure the row is in the large row cache
+    tail_probability(n, n, wild)
+    return _large_tail_rows[(DIE_SIDES, wild, n)]
 
 
 def dudo_dial(ratio):
@@ -381,25 +1112,169 @@ def dudo_dial(ratio):
     # return -.22
 
 
-def get_all_bets(total_dice_count, previous_dice_count,
-                next_dice_count, cup, bet_state, palifico=False):
+def dudo_probability(total_dice_count, previous_dice_count, cup, bet_state,
+                        face_counts=None):
     """
-    Retrieve all potential new bets and their probabilities of success
+    Get the probability of success of calling dudo, as in get_all_bets
+
+    Arguments: see get_all_bets (bet_state must not be None)
+
+    returns a float
+    """
+
+    hand = hand_totals(cup, face_counts)
+    n = total_dice_count - len(cup)
+    die_number = bet_state.num
+    return 1 - tail_probability(n, bet_state.total - hand[die_number],
+                                die_number != 1)  \
+            + dudo_dial(len(cup) / previous_dice_count)
+
+
+def hand_totals(cup, face_counts=None):
+    """
+    Count how many of a player's dice count toward a bet on each number
+
+    Arguments:
+        cup (list of ints) : the player's cup
+        face_counts (list of ints) : the cup's face counts (see Player), if
+            the caller already keeps them. Then cup is not looked at.
+
+    returns a list of ints indexed by die number (index 0 is unused), where
+        1s are counted toward every number, as they are wild
+    """
+
+    if face_counts != None:
+        hand = face_counts[:]
+    else:
+        hand = [0] * (DIE_SIDES + 1)
+        for d in cup:
+            hand[d] += 1
+    for num in range(2, DIE_SIDES + 1):
+        hand[num] += hand[1]
+    return hand
+
+
+# Number of game states that the move caches remember by default. They are
+# off (0) by default: in simulations about 40% of turns repeat an earlier
+# state, and at that rate a lookup that misses costs about as much as the
+# hits save. They pay off on workloads that see the same states again and
+# again, like scoring recorded positions.
+STATE_CACHE_SIZE = 0
+
+
+class StateCache():
+    """
+    Results kept by game state, forgetting the least recently used first
+
+    Attributes:
+        size - int representing the most results that are kept (0 turns the
+               cache off)
+        entries - OrderedDict of state keys and results, oldest first
+        hits - int representing how many lookups found a result
+        misses - int representing how many lookups found nothing
+        evictions - int representing how many results were forgotten to
+                    make room
+    """
+
+    def __init__(self, size=STATE_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # returns the result for key, or None. (The check is "is None", so a
+    # result can be any object, such as a NumPy array.)
+    def get(self, key):
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+        else:
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return result
+
+    def put(self, key, result):
+        self.entries[key] = result
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, size):
+        """Change the size of the cache, forgetting results that don't fit"""
+        self.size = size
+        while len(self.entries) > size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def counters(self):
+        """returns a tuple of ints (hits, misses, evictions)"""
+        return self.hits, self.misses, self.evictions
+
+
+# the caches of get_all_bets and best_move
+all_bets_cache = StateCache()
+best_move_cache = StateCache()
+
+
+def state_key(total_dice_count, previous_dice_count, cup, bet_state,
+                palifico=False, face_counts=None):
+    """
+    Get the canonical state that the move list depends on
+
+    The order of the dice in the cup doesn't matter, only how many show
+    each number. The previous player's cup size only matters once there is
+    a bet to call dudo on, and the next player's cup size never does (see
+    get_all_bets).
+
+    Arguments: see get_all_bets
+
+    returns a tuple
+    """
+
+    if face_counts != None:
+        counts = tuple(face_counts)
+    else:
+        counts = [0] * (DIE_SIDES + 1)
+        for d in cup:
+            counts[d] += 1
+        counts = tuple(counts)
+
+    if bet_state == None:
+        return total_dice_count, counts, palifico
+    return total_dice_count, counts, palifico, previous_dice_count,  \
+            bet_state.num, bet_state.total
+
+
+def cache_counters():
+    """
+    returns a dict of the (hits, misses, evictions) of each StateCache
+    """
+
+    return {"get_all_bets": all_bets_cache.counters(),
+            "best_move": best_move_cache.counters()}
+
+
+def candidate_groups(total_dice_count, bet_state, palifico=False):
+    """
+    List the bets that computer players consider, grouped by quantity
 
     Arguments:
         total_dice_count (int) : the total number of dice in play
-        previous_dice_count (int) : the previous player's cup size
-        next_dice_count (int) : the next player's cup size
-        cup (list of ints) : the current player's cup
-        bet_state (Bet object) : the current bet state
+        bet_state (Bet object) : the current bet state, or None
         palifico (Bool) : set to True when palifico rules are in play
 
-    returns a list of tuples of form (b, prob),
-        where b is a Bet object and prob is a float
+    returns a list of tuples of form (first_num, last_num, total, dialed),
+        each standing for the bets on every number from first_num to
+        last_num with quantity total, in the same order as the move list
+        from get_all_bets (dudo is not included). dialed is True for the bets
+        whose probability is adjusted by dudo_dial, as the next player is the
+        one who will judge them.
     """
 
-    move_list = []
-
     # if it is the first turn, create an initial betting scenario
     if bet_state == None:
 
@@ -409,20 +1284,148 @@ def get_all_bets(total_dice_count, previous_dice_count,
         # in case there are very few dice in play, make the minimum quantity 1
         if quantity <= 0:
             quantity = 1
-
-        # get probability of success for a bet where num = 1
-        prob = get_probability(total_dice_count, cup, Bet(1, quantity))
-        move_list.append((Bet(1, quantity), prob))
+        groups = [(1, 1, quantity, False)]
 
         # bets for all num > 1
         if not palifico:
             quantity = round(2 * total_dice_count / DIE_SIDES - 1)
         if quantity <= 0:
             quantity = 1
-        for num in range(2, DIE_SIDES + 1):
-            prob = get_probability(total_dice_count, cup, Bet(num, quantity), palifico)
-            move_list.append((Bet(num, quantity), prob))
+        groups.append((2, DIE_SIDES, quantity, False))
+
+        return groups
+
+    # the raises are the smallest legal quantities from the table of
+    # raises, the same one that check_bet uses
+    die_number = bet_state.num
+    quantity = bet_state.total
+    row = raise_row(bet_state, palifico)
+    groups = []
+
+    # bet of total += 1. Note: if quantity == total_dice_count (unlikely),
+    # then this bet always has a probability of 0, so it will be skipped.
+    if quantity != total_dice_count:
+        groups.append((die_number, die_number, row[die_number], True))
+
+    # In palifico rounds, return here to avoid bets that change the die number
+    if palifico:
+        return groups
+
+    # if die_number == 1, consider all bets where
+    # num > 1 and total = total * 2 + 1
+    if die_number == 1:
+        groups.append((2, DIE_SIDES, row[2], True))
+        return groups
+
+    # changing num to 1, with half the total (rounding up)
+    groups.append((1, 1, row[1], False))
 
+    # all bets created by adding to num, keeping the total (any total is
+    # legal, but computer players don't lower it)
+    if die_number != DIE_SIDES:
+        groups.append((die_number + 1, DIE_SIDES, quantity, False))
+
+    return groups
+
+
+def bet_candidates(total_dice_count, bet_state, palifico=False):
+    """
+    List the bets that computer players consider on their turn
+
+    Arguments: see candidate_groups
+
+    returns a list of tuples of form (num, total, dialed), in the same order
+        as the move list from get_all_bets (dudo is not included)
+    """
+
+    candidates = []
+    for first_num, last_num, total, dialed in candidate_groups(
+                                    total_dice_count, bet_state, palifico):
+        for num in range(first_num, last_num + 1):
+            candidates.append((num, total, dialed))
+    return candidates
+
+
+def get_all_bets(total_dice_count, previous_dice_count,
+                next_dice_count, cup, bet_state, palifico=False,
+                face_counts=None):
+    """
+    Retrieve all potential new bets and their probabilities of success
+
+    The player's hand is counted once, and every candidate from
+    bet_candidates is then scored straight from the tail table. When
+    all_bets_cache is turned on (all_bets_cache.resize), results are kept by
+    canonical state (see state_key), so a repeated state is looked up.
+
+    Arguments:
+        total_dice_count (int) : the total number of dice in play
+        previous_dice_count (int) : the previous player's cup size
+        next_dice_count (int) : the next player's cup size
+        cup (list of ints) : the current player's cup
+        bet_state (Bet object) : the current bet state
+        palifico (Bool) : set to True when palifico rules are in play
+        face_counts (list of ints) : the cup's face counts, if known (see
+            hand_totals)
+
+    returns a list of tuples of form (b, prob),
+        where b is a Bet object and prob is a float
+    """
+
+    if all_bets_cache.size == 0:
+        return _score_all_bets(total_dice_count, previous_dice_count,
+                                next_dice_count, cup, bet_state, palifico,
+                                face_counts)
+
+    key = state_key(total_dice_count, previous_dice_count, cup, bet_state,
+                    palifico, face_counts)
+    moves = all_bets_cache.get(key)
+    if moves == None:
+        move_list = _score_all_bets(total_dice_count, previous_dice_count,
+                                    next_dice_count, cup, bet_state,
+                                    palifico, face_counts)
+        all_bets_cache.put(key, _pack_moves(move_list))
+        return move_list
+
+    move_list = []
+    for move, prob in moves:
+        if move != "Dudo":
+            move = Bet(move[0], move[1])
+        move_list.append((move, prob))
+    return move_list
+
+
+def _pack_moves(move_list):
+    """
+    Turn a move list into a tuple of ints, floats and strs for a StateCache
+
+    A cache holding Bet objects and lists would make every garbage
+    collection look through all of them, which costs more than the cache
+    saves. Tuples of plain values are left alone once they have been
+    checked.
+    """
+
+    moves = []
+    for move, prob in move_list:
+        if move != "Dudo":
+            move = (move.num, move.total)
+        moves.append((move, prob))
+    return tuple(moves)
+
+
+def _score_all_bets(total_dice_count, previous_dice_count,
+                next_dice_count, cup, bet_state, palifico, face_counts):
+    """Work out the move list for get_all_bets, without the cache"""
+
+    move_list = []
+    hand = hand_totals(cup, face_counts)
+    n = total_dice_count - len(cup)
+
+    if bet_state == None:
+        for num, total, dialed in bet_candidates(total_dice_count, None,
+                                                palifico):
+            prob = tail_probability(n, total - hand[num],
+                                    num != 1 and not palifico)
+            move_list.append((Bet(num, total), prob))
         return move_list
 
     # Calculate dudo_dial for a dudo call, using previous player's dice count
@@ -430,51 +1433,281 @@ def get_all_bets(total_dice_count, previous_dice_count,
     dial_1 = dudo_dial(dudo_ratio)
 
     # Get dudo probability of success
-    dudo_prob = 1 - get_probability(total_dice_count, cup, bet_state) + dial_1
+    die_number = bet_state.num
+    dudo_prob = 1 - tail_probability(n, bet_state.total - hand[die_number],
+                                    die_number != 1) + dial_1
     move_list.append(("Dudo", dudo_prob))
 
     # Calculate dudo_dial for bets, using next player's dice count
     betting_ratio = next_dice_count / len(cup)
     dial_2 = dudo_dial(dudo_ratio)
 
-    # Extract bet state into variables
-    die_number = bet_state.num
-    quantity = bet_state.total
+    for num, total, dialed in bet_candidates(total_dice_count, bet_state,
+                                            palifico):
+        prob = tail_probability(n, total - hand[num], num != 1 and not palifico)
+        if dialed:
+            prob -= dial_2
+        move_list.append((Bet(num, total), prob))
 
-    # bet of total += 1. Note: if quantity == total_dice_count (unlikely),
-    # then this bet always has a probability of 0, so it will be skipped.
-    if quantity != total_dice_count:
-        prob = get_probability(total_dice_count, cup, Bet(die_number, quantity + 1), palifico) - dial_2
-        move_list.append((Bet(die_number, quantity + 1), prob))
+    return move_list
 
-    # In palifico rounds, return here to avoid bets that change the die number
-    if palifico:
-        return move_list
 
-    # if die_number == 1, get probability of success for all bets where
-    # num > 1 and total = total * 2 + 1
-    if die_number == 1:
-        q = quantity * 2 + 1
-        for num in range(2, DIE_SIDES + 1):
-            prob = get_probability(total_dice_count, cup, Bet(num, q)) - dial_2
-            move_list.append((Bet(num, q), prob))
-        return move_list
+def best_move(total_dice_count, previous_dice_count,
+                next_dice_count, cup, bet_state, palifico=False,
+                face_counts=None):
+    """
+    Find the move with the highest probability of success
+
+    Gives the same move as scanning the list from get_all_bets for the
+    highest probability with >= (so a tie goes to the later move), but
+    without building the list. The bets in each group from candidate_groups
+    share a quantity, and a bet's probability can only fall as the number
+    of matching dice in the player's hand falls. So each group is judged by
+    the number with the most matching dice, skipped entirely if that can't
+    beat the best move so far, and otherwise searched from the end for the
+    last number that ties it. Results can be kept in best_move_cache, like
+    get_all_bets.
+
+    Arguments: see get_all_bets
+
+    returns a tuple of form (move, prob), where move is a Bet object or
+        "Dudo" and prob is a float. move is None if no move has a
+        probability of at least 0.
+    """
 
-    # get probability of success when changing num to 1
-    if quantity % 2 == 1:
-        q = int((quantity + 1) / 2)
-    else:
-        q = int(quantity / 2)
-    prob = get_probability(total_dice_count, cup, Bet(1, q))
-    move_list.append((Bet(1, q), prob))
+    if best_move_cache.size == 0:
+        return _find_best_move(total_dice_count, previous_dice_count, cup,
+                                bet_state, palifico, face_counts)
+
+    key = state_key(total_dice_count, previous_dice_count, cup, bet_state,
+                    palifico, face_counts)
+    result = best_move_cache.get(key)
+    if result == None:
+        result = _find_best_move(total_dice_count, previous_dice_count, cup,
+                                    bet_state, palifico, face_counts)
+
+        # the cache keeps the bet as (num, total), a tuple of ints that the
+        # garbage collector doesn't have to keep track of
+        move, prob = result
+        if type(move) == Bet:
+            best_move_cache.put(key, ((move.num, move.total), prob))
+        else:
+            best_move_cache.put(key, result)
+        return result
+
+    move, prob = result
+    if type(move) == tuple:
+        move = Bet(move[0], move[1])
+    return move, prob
+
+
+def _find_best_move(total_dice_count, previous_dice_count, cup, bet_state,
+                        palifico, face_counts):
+    """Find the best move for best_move, without the cache"""
+
+    hand = hand_totals(cup, face_counts)
+    n = total_dice_count - len(cup)
+    best = None
+    highest_prob = 0
+
+    if bet_state != None:
+        # Calculate dudo_dial using previous player's dice count
+        dial = dudo_dial(len(cup) / previous_dice_count)
+        die_number = bet_state.num
+        dudo_prob = 1 - tail_probability(n, bet_state.total - hand[die_number],
+                                        die_number != 1) + dial
+        if dudo_prob >= highest_prob:
+            highest_prob = dudo_prob
+            best = "Dudo"
+
+    for first_num, last_num, total, dialed in candidate_groups(
+                                    total_dice_count, bet_state, palifico):
+        # the number with the most matching dice
+        top_num = first_num
+        for num in range(first_num + 1, last_num + 1):
+            if hand[num] >= hand[top_num]:
+                top_num = num
+
+        wild = first_num != 1 and not palifico
+        prob = tail_probability(n, total - hand[top_num], wild)
+        if dialed:
+            prob -= dial
+        if prob < highest_prob:
+            continue
+
+        # a later number with fewer matching dice may still tie top_num
+        num = last_num
+        while num > top_num:
+            if tail_probability(n, total - hand[num], wild) ==  \
+                tail_probability(n, total - hand[top_num], wild):
+                break
+            num -= 1
+
+        highest_prob = prob
+        best = (num, total)
+
+    if best == None or best == "Dudo":
+        return best, highest_prob
+    return Bet(best[0], best[1]), highest_prob
+
+
+# The functions and Game methods that enable_profiling can count and time.
+# Together they cover the probability math (tail_probability,
+# get_probability), move generation (best_move, get_all_bets) and the game
+# state changes (the Game methods, where __init__ counts the games).
+PROFILED_FUNCTIONS = ["tail_probability", "get_probability", "best_move",
+                        "get_all_bets"]
+PROFILED_METHODS = ["__init__", "make_safest_move", "make_bet", "dudo",
+                        "start_new_round"]
+
+# the original functions and methods while profiling is enabled, else None
+_unprofiled = None
+
+
+class Profile():
+    """
+    Call counts and times of the engine's hot paths
 
-    # get probability of success for all bets created by adding to num
-    if die_number != DIE_SIDES:
-        for num in range(die_number + 1, DIE_SIDES + 1):
-            prob = get_probability(total_dice_count, cup, Bet(num, quantity))
-            move_list.append((Bet(num, quantity), prob))
+    Attributes:
+        calls - dict of names and the number of times each was called
+        ns - dict of names and the total nanoseconds spent in each call,
+             including any profiled calls inside it
+        wall_ns - int representing the nanoseconds that profiling was enabled
+        games - int representing the number of games started
+
+    Two Profile objects can be added together, e.g. to merge the profiles
+    of several worker processes.
+    """
 
-    return move_list
+    def __init__(self):
+        self.calls = {}
+        self.ns = {}
+        self.wall_ns = 0
+        self.games = 0
+        self.started = None
+
+    def add(self, name, ns):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.ns[name] = self.ns.get(name, 0) + ns
+
+    def __add__(self, other):
+        merged = Profile()
+        for profile in (self, other):
+            for name in profile.calls:
+                merged.calls[name] = merged.calls.get(name, 0) +  \
+                                        profile.calls[name]
+                merged.ns[name] = merged.ns.get(name, 0) + profile.ns[name]
+            merged.wall_ns += profile.wall_ns
+            merged.games += profile.games
+        return merged
+
+    def report(self):
+        """
+        Print the calls, calls per game, total and mean time of each profiled
+        function, and its share of the time profiling was enabled
+
+        Note: timing a call costs roughly 100ns, which is included in the
+            times of the profiled calls around it (e.g. best_move includes
+            the timing of its tail_probability calls)
+        """
+
+        wall_ns = self.wall_ns
+        if self.started != None:
+            wall_ns += perf_counter_ns() - self.started
+
+        print(f"{self.games} games, {wall_ns / 1e6:.1f} ms")
+        print(f"{'name':<24} {'calls':>10} {'per game':>10} "\
+                f"{'total ms':>10} {'mean ns':>10} {'wall':>7}")
+        for name in sorted(self.ns, key=self.ns.get, reverse=True):
+            calls = self.calls[name]
+            ns = self.ns[name]
+            per_game = calls / self.games if self.games else 0
+            share = ns / wall_ns if wall_ns else 0
+            print(f"{name:<24} {calls:>10} {per_game:>10.1f} "\
+                    f"{ns / 1e6:>10.1f} {ns / calls:>10.0f} {share:>7.1%}")
+
+
+def _timed(name, function, profile):
+    """Wrap function so that each call is counted and timed in profile"""
+
+    def timed(*args, **kwargs):
+        start = perf_counter_ns()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.add(name, perf_counter_ns() - start)
+
+    return timed
+
+
+def enable_profiling(profile=None):
+    """
+    Start counting and timing the calls in PROFILED_FUNCTIONS and
+    PROFILED_METHODS
+
+    The functions and methods are swapped for timed versions until
+    disable_profiling is called, so profiling costs nothing while it is
+    disabled. Only one profile can be recorded at a time.
+
+    Arguments:
+        profile (Profile object) : the profile to add to (None starts a new
+            one)
+
+    returns the Profile object
+    """
+
+    global _unprofiled
+    disable_profiling()
+
+    if profile == None:
+        profile = Profile()
+    module = globals()
+    _unprofiled = {}
+    for name in PROFILED_FUNCTIONS:
+        _unprofiled[name] = module[name]
+        module[name] = _timed(name, module[name], profile)
+
+    for name in PROFILED_METHODS:
+        method = Game.__dict__[name]
+        _unprofiled["Game." + name] = method
+        setattr(Game, name, _timed("Game." + name, method, profile))
+
+    # count the games as they are created
+    timed_init = Game.__init__
+    def init(self, *args, **kwargs):
+        profile.games += 1
+        timed_init(self, *args, **kwargs)
+    Game.__init__ = init
+
+    _unprofiled["profile"] = profile
+    profile.started = perf_counter_ns()
+    return profile
+
+
+def disable_profiling():
+    """
+    Stop profiling, and put back the original functions and methods
+
+    returns the Profile object that was being recorded, or None if
+        profiling wasn't enabled
+    """
+
+    global _unprofiled
+    if _unprofiled == None:
+        return None
+
+    profile = _unprofiled.pop("profile")
+    profile.wall_ns += perf_counter_ns() - profile.started
+    profile.started = None
+
+    module = globals()
+    for name, original in _unprofiled.items():
+        if name.startswith("Game."):
+            setattr(Game, name[5:], original)
+        else:
+            module[name] = original
+    _unprofiled = None
+    return profile
 
 
 class Error(Exception):
@@ -2,6 +2,7 @@
 # Single player command-line game of Perudo vs. computers
 # See rules.txt for an English language explanation of the rules
 
+import mcts
 import perudo
 from time import sleep
 
@@ -26,12 +27,28 @@ def main():
             continue
         break
 
+    # computer players can search ahead for their moves (see mcts.py),
+    # which makes them stronger but slower
+    while True:
+        answer = input("Should the computer players search ahead for "\
+                        "their moves? They are stronger, but take about a "\
+                        "second per move. (y/n)\n")
+        if answer not in ["y", "Y", "n", "N"]:
+            print("You must enter y or n.")
+            continue
+        break
+
     # start a game
     my_game = perudo.Game(player_count + 1)
 
     # assign human player to the highest player number
     human = player_count
 
+    # one search player for each computer, so each keeps its own tree
+    searchers = None
+    if answer in ["y", "Y"]:
+        searchers = [mcts.MCTSPlayer() for i in range(player_count)]
+
     # loop that begins every round of play
     while True:
         print(f"Round {my_game.round}, start!\n")
@@ -67,11 +84,10 @@ def main():
                     "first to bet this round.\n")
         sleep(2)
 
-        previous_player = None
-
         # loop that begins each turn
         while True:
             betting_player = my_game.current_player
+            outcome = None
 
             if betting_player == human:
                 while True:
@@ -83,7 +99,7 @@ def main():
                         # attempt dudo, loop back to get bet again if invalid
                         if move == "dudo":
                             try:
-                                my_game.dudo()
+                                outcome = my_game.dudo()
                                 break
                             except perudo.MoveError as err:
                                 print(f"{err}\n")
@@ -103,67 +119,67 @@ def main():
                             continue
 
             # it is not the human's turn, so let a computer bet
+            elif searchers != None:
+                outcome = searchers[betting_player].make_move(my_game)
             else:
-                my_game.make_safest_move()
+                outcome = my_game.make_safest_move()
 
             # if dudo was called, print the result
             # this block will need significant changes to implement calza
-            if my_game.current_bet == None:
-                # next_player will start the next round
-                # note next_player isn't necessarily the loser of the dudo call
-                next_player = my_game.current_player
+            if outcome != None:
+                defender = outcome.defender
 
                 # human player called dudo
                 if betting_player == human:
 
-                    if my_game.players[human].cup == []:
+                    if not outcome.successful and outcome.eliminated:
                         print("You called dudo and lost!\n"\
                                 "You were eliminated from the game.")
                         return  # end of game
 
-                    elif my_game.players[previous_player].cup == []:
+                    elif outcome.eliminated:
                         print("You called dudo and won!\n"\
-                                f"Player {previous_player + 1} was "\
+                                f"Player {defender + 1} was "\
                                 "eliminated from the game.\n")
 
-                    elif next_player == human:
+                    elif not outcome.successful:
                         print(f"You called dudo and lost!\n"\
                                 "You lost one die.\n")
 
                     else:
                         print("You called dudo and won!\n"\
-                                f"Player {previous_player + 1} lost one die.\n")
+                                f"Player {defender + 1} lost one die.\n")
 
                     sleep(2)
 
                 # computer player called dudo
                 else:
-                    if my_game.players[betting_player].cup == []:
+                    if not outcome.successful and outcome.eliminated:
                         print(f"Player {betting_player + 1} called dudo and "\
                                 "lost!\nThey were "\
                                 "eliminated from the game.\n")
 
-                    elif my_game.players[previous_player].cup == []:
+                    elif outcome.eliminated:
                         print(f"Player {betting_player + 1} called dudo "\
                                 "and won!")
 
-                        if previous_player == human:
+                        if defender == human:
                             print("You lost your last die. Game Over!")
                             return  # end of game
 
                         else:
-                            print(f"Player {previous_player + 1} was "
+                            print(f"Player {defender + 1} was "
                                     "eliminated from the game.\n")
 
-                    elif betting_player != next_player:
+                    elif outcome.successful:
                         print(f"Player {betting_player + 1} called dudo "\
                                 "and won!")
 
-                        if next_player == human:
+                        if defender == human:
                             print("You lost one die.\n")
 
                         else:
-                            print(f"Player {previous_player + 1} lost "\
+                            print(f"Player {defender + 1} lost "\
                                     "one die.\n")
 
                     else:
@@ -184,9 +200,6 @@ def main():
 
                 print(f"Die Number: {my_game.current_bet.num} and "\
                     f"Quantity: {my_game.current_bet.total}\n")
-
-                # update previous_player for the next turn
-                previous_player = betting_player
                 sleep(2)
 
         if my_game.dice_count == len(my_game.players[human].cup):
@@ -0,0 +1,249 @@
+# Charles Dieterle
+# Precomputed table of the safest move for every game state
+# For a fixed DIE_SIDES, DICE_PER_PLAYER and player count, the states that a
+# computer player can see are finite. build() works out the safest move of
+# each one and saves them to a file, and PolicyTable looks them up from a
+# memory-mapped copy of that file.
+# Build a table with Python 3: python policy_table.py player_count file
+
+import mmap
+import perudo
+import struct
+import sys
+from array import array
+from itertools import combinations_with_replacement
+from time import perf_counter
+
+MAGIC = b"PERUDOPT"
+VERSION = 1
+
+# magic, version, byte order (1 for little endian), DIE_SIDES,
+# DICE_PER_PLAYER, max_dice
+HEADER = struct.Struct("<8sIIIII")
+
+def hand_indexes():
+    """
+    Number every hand a player can hold
+
+    returns a dict of face count tuples (see perudo.Player.face_counts) and
+        ints from 0 up, for every cup of 1 to DICE_PER_PLAYER dice
+    """
+
+    indexes = {}
+    for size in range(1, perudo.DICE_PER_PLAYER + 1):
+        for cup in combinations_with_replacement(
+                                range(1, perudo.DIE_SIDES + 1), size):
+            counts = [0] * (perudo.DIE_SIDES + 1)
+            for d in cup:
+                counts[d] += 1
+            indexes[tuple(counts)] = len(indexes)
+    return indexes
+
+
+class Layout():
+    """
+    Where each state's entry is in the table
+
+    The table starts with the states before a bet (which don't depend on
+    the previous player's cup size), followed by the states with a bet.
+    A bet in play can't be for more than max_dice dice, but the move a
+    computer player makes can go up to 2 * max_dice + 1 (2 * total + 1
+    after a bet on 1s).
+
+    Attributes:
+        max_dice - int representing the most dice in play
+        hands - dict from hand_indexes
+        opening_size - int representing the number of states before a bet
+        size - int representing the number of states in the table
+        move_totals - int representing the number of move totals per number
+    """
+
+    def __init__(self, max_dice):
+        self.max_dice = max_dice
+        self.hands = hand_indexes()
+        self.move_totals = 2 * max_dice + 1
+        self.opening_size = (max_dice + 1) * len(self.hands) * 2
+        self.size = self.opening_size + (max_dice + 1) * len(self.hands) *  \
+                    perudo.DICE_PER_PLAYER * 2 * perudo.DIE_SIDES * max_dice
+        if perudo.DIE_SIDES * self.move_totals + 2 > 65535:
+            raise ValueError("Too many dice in play to encode every bet.")
+
+    def index(self, total_dice_count, previous_dice_count, face_counts,
+                bet_state, palifico):
+        """
+        Get the position of a state in the table
+
+        returns an int, or None if the state is outside of the table
+        """
+
+        hand = self.hands.get(tuple(face_counts))
+        if hand == None or total_dice_count > self.max_dice:
+            return None
+        index = (total_dice_count * len(self.hands) + hand) * 2 + palifico
+        if bet_state == None:
+            return index
+
+        if previous_dice_count > perudo.DICE_PER_PLAYER or  \
+                                        bet_state.total > self.max_dice:
+            return None
+        index = (index * perudo.DICE_PER_PLAYER + previous_dice_count - 1) *  \
+                perudo.DIE_SIDES + bet_state.num - 1
+        return self.opening_size + index * self.max_dice +  \
+                bet_state.total - 1
+
+    # code of a move: 0 for no move (not in the table), 1 for dudo, and 2
+    # and up for the bets
+    def encode(self, move):
+        if move == None:
+            return 0
+        if move == "Dudo":
+            return 1
+        return 2 + (move.num - 1) * self.move_totals + move.total - 1
+
+    def decode(self, code):
+        if code == 1:
+            return "Dudo"
+        num, total = divmod(code - 2, self.move_totals)
+        return perudo.Bet(num + 1, total + 1)
+
+
+def build(player_count, path):
+    """
+    Work out the safest move of every state and save them to a file
+
+    Covers every total number of dice up to player_count * DICE_PER_PLAYER,
+    every hand, previous player cup size, bet and palifico setting that
+    fit in that total.
+
+    Arguments:
+        player_count (int) - number of players at the start of a game
+        path (str) - file to save the table to
+
+    returns the number of states worked out
+    """
+
+    max_dice = player_count * perudo.DICE_PER_PLAYER
+    layout = Layout(max_dice)
+    perudo.build_tail_table(max_dice)
+    moves = array("H", bytes(2 * layout.size))
+    probs = array("f", bytes(4 * layout.size))
+
+    count = 0
+    for counts, hand in layout.hands.items():
+        cup = []
+        for num in range(1, perudo.DIE_SIDES + 1):
+            cup += [num] * counts[num]
+
+        for total_dice_count in range(len(cup) + 1, max_dice + 1):
+            for palifico in (False, True):
+                states = [(1, None)]
+                for previous in range(1, min(perudo.DICE_PER_PLAYER,
+                                        total_dice_count - len(cup)) + 1):
+                    for num in range(1, perudo.DIE_SIDES + 1):
+                        for total in range(1, total_dice_count + 1):
+                            states.append((previous, perudo.Bet(num, total)))
+
+                for previous, bet in states:
+                    move, prob = perudo._find_best_move(total_dice_count,
+                                    previous, cup, bet, palifico,
+                                    list(counts))
+                    index = layout.index(total_dice_count, previous, counts,
+                                            bet, palifico)
+                    moves[index] = layout.encode(move)
+                    probs[index] = prob
+                    count += 1
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, int(sys.byteorder == "little"),
+                            perudo.DIE_SIDES, perudo.DICE_PER_PLAYER,
+                            max_dice))
+        moves.tofile(f)
+        probs.tofile(f)
+    return count
+
+
+class PolicyTable():
+    """
+    A table saved by build, memory-mapped for lookups
+
+    Attributes:
+        layout - Layout object of the table
+        moves - memoryview of the move code of each state
+        probs - memoryview of the probability of success of each state's
+                move (as a 32 bit float)
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, little, sides, dice, max_dice =  \
+                                            HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a policy table.")
+        if little != int(sys.byteorder == "little"):
+            raise ValueError(f"{path} was built on a machine with a "\
+                                "different byte order.")
+        if sides != perudo.DIE_SIDES or dice != perudo.DICE_PER_PLAYER:
+            raise ValueError(f"{path} was built for {dice} dice with "\
+                                f"{sides} sides each.")
+
+        self.layout = Layout(max_dice)
+        view = memoryview(self.map)
+        start = HEADER.size
+        end = start + 2 * self.layout.size
+        self.moves = view[start:end].cast("H")
+        self.probs = view[end:end + 4 * self.layout.size].cast("f")
+
+    def lookup(self, total_dice_count, previous_dice_count, cup, bet_state,
+                palifico=False, face_counts=None):
+        """
+        Look up the safest move of a state
+
+        Arguments: see perudo.best_move
+
+        returns a tuple of form (move, prob) like perudo.best_move, or None
+            if the state isn't in the table. The probability of a dudo call
+            is worked out again, so it is exactly the same as best_move's;
+            the probability of a bet is read from the table.
+        """
+
+        if face_counts == None:
+            face_counts = [0] * (perudo.DIE_SIDES + 1)
+            for d in cup:
+                face_counts[d] += 1
+        index = self.layout.index(total_dice_count, previous_dice_count,
+                                    face_counts, bet_state, palifico)
+        if index == None:
+            return None
+        code = self.moves[index]
+        if code == 0:
+            return None
+        if code == 1:
+            return "Dudo", perudo.dudo_probability(total_dice_count,
+                            previous_dice_count, cup, bet_state, face_counts)
+        return self.layout.decode(code), self.probs[index]
+
+    def close(self):
+        self.moves.release()
+        self.probs.release()
+        self.map.close()
+
+
+def load(path):
+    """
+    Open a policy table, and have perudo.Game.make_safest_move use it
+
+    returns the PolicyTable object
+    """
+
+    perudo.policy_table = PolicyTable(path)
+    return perudo.policy_table
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python policy_table.py player_count file")
+        sys.exit(1)
+    start = perf_counter()
+    count = build(int(sys.argv[1]), sys.argv[2])
+    print(f"Worked out {count} states in {perf_counter() - start:.1f}s")
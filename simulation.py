@@ -2,7 +2,98 @@
 # Perudo simulator (no human players)
 # See rules.txt for an English language explanation of the rules
 
+import harness
 import perudo
+from accumulators import Collector
+
+class SummaryCollector(Collector):
+    """
+    Totals up the statistics of single_game over many games
+
+    Attributes:
+        dudo_actual - float, the sum of each game's fraction of correct dudo
+            calls (i.e., the bet was wrong)
+        dudo_calculations - float, the sum of each game's avg calculated
+            probability of dudo success
+        bet_numbers - float, the sum of each game's avg number of bets
+            per round
+        games - int, the number of games played
+        cache_counters - dict of the hits, misses and evictions of the
+            perudo move caches during the games (see perudo.cache_counters)
+    """
+
+    def __init__(self):
+        self.dudo_actual = 0
+        self.dudo_calculations = 0
+        self.bet_numbers = 0
+        self.games = 0
+        self.cache_counters = {}
+
+    def start_run(self):
+        self.run_start = perudo.cache_counters()
+
+    def end_run(self):
+        for name, counters in perudo.cache_counters().items():
+            added = tuple(c - s for c, s in zip(counters,
+                                                self.run_start[name]))
+            previous = self.cache_counters.get(name, (0, 0, 0))
+            self.cache_counters[name] = tuple(a + b for a, b in zip(previous,
+                                                                    added))
+
+    def start_game(self, game):
+        self.successful_dudos = 0
+        self.dudo_prob_sum = 0
+        self.total_bets = 0
+        self.rounds = 0
+
+    def record_bet(self, game):
+        self.total_bets += 1
+
+    def record_dudo(self, outcome):
+        self.dudo_prob_sum += outcome.probability
+        self.rounds += 1
+        if outcome.successful:
+            self.successful_dudos += 1
+
+    def end_game(self, game):
+        self.dudo_actual += self.successful_dudos / self.rounds
+        self.dudo_calculations += self.dudo_prob_sum / self.rounds
+        self.bet_numbers += self.total_bets / self.rounds
+        self.games += 1
+
+    def __add__(self, other):
+        merged = SummaryCollector()
+        merged.dudo_actual = self.dudo_actual + other.dudo_actual
+        merged.dudo_calculations =  \
+                            self.dudo_calculations + other.dudo_calculations
+        merged.bet_numbers = self.bet_numbers + other.bet_numbers
+        merged.games = self.games + other.games
+        for collector in (self, other):
+            for name, counters in collector.cache_counters.items():
+                previous = merged.cache_counters.get(name, (0, 0, 0))
+                merged.cache_counters[name] = tuple(a + b for a, b in
+                                                    zip(previous, counters))
+        return merged
+
+    def report(self):
+        """
+        Print the following statistics:
+            - Actual success rate of dudo calls
+            - Calculated success rate of dudo calls
+            - Avg number of bets per round of play
+            - Hit rate of each move cache (when it was used)
+        """
+
+        print(f"Actual dudo success rate: {self.dudo_actual / self.games}\n" \
+            f"Calculated dudo success rate: "\
+            f"{self.dudo_calculations / self.games}\n" \
+            f"Avg number of bets per round: {self.bet_numbers / self.games}")
+
+        for name, (hits, misses, evictions) in self.cache_counters.items():
+            if hits + misses > 0:
+                print(f"{name} cache: {hits / (hits + misses):.1%} hit rate "\
+                        f"({hits} hits, {misses} misses, "\
+                        f"{evictions} evictions)")
 
 def single_game(player_count):
     """
@@ -17,40 +108,24 @@ def single_game(player_count):
         - Avg number of bets per round
     """
 
-    my_game = perudo.Game(player_count)
-    successful_dudos = 0
-    dudo_prob_sum = 0
-    total_bets = 0
-    rounds = 0
-
-    # need to keep track of previous player to get accurate dudo measurement
-    previous_player = None
-
-    while my_game.players_left() > 1:
-        betting_player = my_game.current_player
-        safest_move = my_game.make_safest_move()
+    summary = SummaryCollector()
+    harness.play_games(1, player_count, [summary])
+    return summary.dudo_actual, summary.dudo_calculations, summary.bet_numbers
 
-        if type(safest_move) == float:
-            dudo_prob_sum += safest_move
-            rounds += 1
-            if betting_player != my_game.current_player and  \
-            my_game.players[previous_player].cup != []:
-                successful_dudos += 1
-            previous_player = None
-
-        else:
-            total_bets += 1
-            previous_player = betting_player
-
-    return successful_dudos / rounds, dudo_prob_sum / rounds, total_bets / rounds
-
-def simulator(player_count, num_trials):
+def simulator(player_count, num_trials, workers=None, seed=None,
+                cache_size=None):
     """
     Simulate multiple games of Perudo
 
     Arguments:
         player_count (int) - number of players in the game
         num_trials (int) - number of games simulated
+        workers (int) - number of processes to share the games between
+            (None simulates every game in this process)
+        seed (int) - master random seed; the same seed gives the same
+            results for any number of workers (None picks one at random)
+        cache_size (int) - number of states the move caches remember (None
+            leaves them at perudo.STATE_CACHE_SIZE, which is off)
 
     Print the following statistics:
         - Actual success rate of dudo calls
@@ -58,19 +133,10 @@ def simulator(player_count, num_trials):
         - Avg number of bets per round of play
     """
 
-    dudo_actual = []
-    dudo_calculations = []
-    bet_numbers = []
-
-    for i in range(num_trials):
-        dudo_fraction, dudo_calculated, bet_num = single_game(player_count)
-        dudo_actual.append(dudo_fraction)
-        dudo_calculations.append(dudo_calculated)
-        bet_numbers.append(bet_num)
-
-    print(f"Actual dudo success rate: {sum(dudo_actual) / num_trials}\n" \
-        f"Calculated dudo success rate: {sum(dudo_calculations) / num_trials}\n" \
-        f"Avg number of bets per round: {sum(bet_numbers) / num_trials}")
+    summary, = harness.run(player_count, num_trials, [SummaryCollector()],
+                            workers, seed, cache_size)
+    summary.report()
 
-# change the arguments below to desired player count and number of games
-simulator(6, 1000)
\ No newline at end of file
+if __name__ == "__main__":
+    # change the arguments below to desired player count and number of games
+    simulator(6, 1000)
@@ -0,0 +1,22 @@
+# Charles Dieterle
+# Regression tests for mcts.py
+# Run with Python 3: python -m pytest test_mcts.py
+
+import mcts
+
+
+def test_small_budget_makes_only_legal_bets():
+    # with one playout per move, the search picks nearly at random among
+    # its candidates, so any illegal one (like a bet doubled off 1s past
+    # the dice in play) is soon sent to Game.make_bet, which raises
+    for seed in range(100):
+        for player_count in (2, 3):
+            mcts.tournament(1, player_count, None, seed=seed, node_limit=1)
+
+
+def test_moves_stay_within_dice_in_play():
+    searcher = mcts.MCTSPlayer(None, 1)
+    searcher.dice_count, searcher.palifico = 6, False
+    for bet in [None, (1, 3), (6, 3), (2, 6)]:
+        for move in searcher.moves(bet):
+            assert move == "Dudo" or move[1] <= searcher.dice_count
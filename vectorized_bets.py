@@ -0,0 +1,88 @@
+# Charles Dieterle
+# NumPy versions of the Perudo move scoring in perudo.py
+# Requires numpy. perudo.py itself only needs the standard library.
+
+import numpy as np
+import perudo
+
+def tail_cube(max_dice):
+    """
+    Stack the tail table into one array for lookups across many games
+
+    Arguments:
+        max_dice (int) - the largest number of unknown dice to be looked up
+
+    returns a float array of shape (2, max_dice + 1, max_dice + 2), where
+        element [wild, n, r] is perudo.tail_probability(n, r, wild) for
+        0 <= r <= n + 1 (r = n + 1 is always 0)
+    """
+
+    cube = np.zeros((2, max_dice + 1, max_dice + 2))
+    for wild in (0, 1):
+        for n in range(max_dice + 1):
+            cube[wild, n, :n + 1] = perudo.tail_row(n, bool(wild))
+    return cube
+
+
+def tail_probabilities(cube, n, r, wild):
+    """
+    Look up many tail probabilities at once
+
+    Arguments:
+        cube (array) - a table from tail_cube, big enough for every n
+        n, r, wild (int or bool arrays) - broadcastable arrays with the same
+            meaning as the arguments of perudo.tail_probability
+
+    returns a float array of probabilities
+    """
+
+    # r < 1 always succeeds and r > n never does, which are the values the
+    # cube holds at r = 0 and r = n + 1
+    planes, width = cube.shape[1:]
+    r = np.minimum(np.maximum(r, 0), n + 1)
+    return cube.ravel().take((wild * planes + n) * width + r)
+
+
+def get_all_bets_vectorized(total_dice_count, previous_dice_count,
+                            next_dice_count, cup, bet_state, palifico=False):
+    """
+    Score every candidate bet with one vectorized lookup
+
+    Takes the same arguments as perudo.get_all_bets and returns the same
+    move list. The candidate (num, total, hand_total) arrays are built from
+    perudo.bet_candidates, so both versions always consider the same moves.
+    """
+
+    n = total_dice_count - len(cup)
+    hand = np.array(perudo.hand_totals(cup))
+    rows = np.zeros((2, n + 1))
+    rows[0] = perudo.tail_row(n, False)
+    rows[1] = perudo.tail_row(n, True)
+
+    candidates = perudo.bet_candidates(total_dice_count, bet_state, palifico)
+    nums, totals, dialed = np.array(candidates, dtype=np.intp).reshape(-1, 3).T
+    wild = (nums != 1) & (not palifico)
+
+    # the dudo call goes in front, judged as a non-palifico bet
+    if bet_state != None:
+        nums = np.concatenate(([bet_state.num], nums))
+        totals = np.concatenate(([bet_state.total], totals))
+        wild = np.concatenate(([bet_state.num != 1], wild))
+
+    r = totals - hand[nums]
+    probs = np.where(r < 1, 1.0,
+                    np.where(r > n, 0.0, rows[wild.astype(np.intp),
+                                              np.clip(r, 0, n)]))
+
+    if bet_state == None:
+        return [(perudo.Bet(int(num), int(total)), float(prob))
+                for num, total, prob in zip(nums, totals, probs)]
+
+    dial = perudo.dudo_dial(len(cup) / previous_dice_count)
+    probs[0] = 1 - probs[0] + dial
+    probs[1:] -= dialed * dial
+
+    move_list = [("Dudo", float(probs[0]))]
+    for num, total, prob in zip(nums[1:], totals[1:], probs[1:]):
+        move_list.append((perudo.Bet(int(num), int(total)), float(prob)))
+    return move_list